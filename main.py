@@ -12,41 +12,442 @@ This demonstrates the full workflow:
 import os
 import sys
 import json
+import atexit
+import threading
+import logging
+import multiprocessing
+import importlib.util
+from logging.handlers import QueueHandler, QueueListener
+import hashlib
+import tempfile
+import gzip
+import shutil
 from pathlib import Path
 from datetime import datetime
+from time import perf_counter
+from functools import lru_cache, partial
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Add module paths
 PROJECT_ROOT = Path(__file__).resolve().parent
 AGENT_ROOT = PROJECT_ROOT / "python_agents"
 
+# Guarded so re-importing this module (e.g. in pool workers) doesn't keep growing sys.path
 for agent_dir in ("ExtractionAgent", "InsightAgent", "VaultAgent"):
-    sys.path.insert(0, str(AGENT_ROOT / agent_dir))
+    agent_path = str(AGENT_ROOT / agent_dir)
+    if agent_path not in sys.path:
+        sys.path.insert(0, agent_path)
 
 from ExtractionAgent import SmartMedicalReportPipeline
 from VaultAgent import SmartVaultManager
 
-# Try to import Clinical Insight modules
-try:
-    import InsightAgent.Summary as SummaryModule
-    import InsightAgent.Recommendation as RecommendationModule
-    CLINICAL_AVAILABLE = True
-except ImportError:
-    CLINICAL_AVAILABLE = False
-    print("⚠️  Clinical Insight modules not fully available")
+# All workflow output goes through this logger (see setup_logging)
+log = logging.getLogger("workflow")
+
+
+# Probe for the Clinical Insight modules without importing them (cheap on API-only deployments)
+CLINICAL_AVAILABLE = all(
+    importlib.util.find_spec(module_name) is not None
+    for module_name in ("Summary", "Recommendation")
+)
+
+
+@lru_cache(maxsize=None)
+def _get_insight_modules():
+    """
+    Imports the Clinical Insight modules once per process.
+    Returns (SummaryModule, RecommendationModule), or None if they are unavailable.
+    """
+    if not CLINICAL_AVAILABLE:
+        log.warning("⚠️  Clinical Insight modules not fully available")
+        return None
+    try:
+        import Summary as SummaryModule
+        import Recommendation as RecommendationModule
+    except (ImportError, SystemExit):  # the modules exit when the API key is missing
+        log.warning("⚠️  Clinical Insight modules not fully available")
+        return None
+    return SummaryModule, RecommendationModule
+
+
+# Layout of a workflow output directory
+EXTRACTIONS_SUBDIR = "extractions"
+VAULTS_SUBDIR = "PatientVaults"
+CACHE_SUBDIR = ".cache"
+BATCH_RESULTS_FILE = "batch_results.jsonl"
+
+# Sample PDFs picked up by demo_workflow
+MAX_SAMPLES = 3
+
+# Output names SmartMedicalReportPipeline gives the medical report JSON
+MEDICAL_REPORT_SUFFIXES = ("_medical_report.json", "_medical_report.json.gz")
+
+# Flag spellings that mark a test result as out of range
+ABNORMAL_FLAGS = frozenset({'H', 'L', 'HH', 'LL', '*', 'HIGH', 'LOW'})
+
+# Canned summary for reports with no abnormal results (see --allow-skip-normal)
+NORMAL_SUMMARY_TEXT = "All reported test results are within their reference ranges; no abnormal findings."
+
+# PDFs processed concurrently per batch in process_multiple_pdfs
+DEFAULT_BATCH_SIZE = 10
+
+
+_LOG_QUEUE = None
+
+
+def setup_logging(level=logging.INFO):
+    """
+    The main process logs straight to stdout, so its lines stay in order with
+    print() output from the agents. Pool workers log into a queue drained by a
+    single listener thread, so they never contend on stdout.
+    Safe to call more than once; returns the queue workers should log into.
+    """
+    global _LOG_QUEUE
+    if _LOG_QUEUE is None:
+        _LOG_QUEUE = multiprocessing.Queue()
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        listener = QueueListener(_LOG_QUEUE, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        log.handlers[:] = [handler]
+        log.setLevel(level)
+        log.propagate = False
+    return _LOG_QUEUE
+
+
+def _attach_log_queue(log_queue, level=logging.INFO):
+    """Point the workflow logger at `log_queue` (also the process-pool initializer)"""
+    log.handlers[:] = [QueueHandler(log_queue)]
+    log.setLevel(level)
+    log.propagate = False
 
 
 def print_header(title):
     """Print formatted section header"""
-    print("\n" + "="*80)
-    print(f"  {title}")
-    print("="*80 + "\n")
+    log.info("\n" + "="*80 + f"\n  {title}\n" + "="*80 + "\n")
 
 
 def print_step(step_num, title):
     """Print step header"""
-    print(f"\n{'─'*80}")
-    print(f"  STEP {step_num}: {title}")
-    print(f"{'─'*80}\n")
+    log.info(f"\n{'─'*80}\n  STEP {step_num}: {title}\n{'─'*80}\n")
+
+
+def _dumps(obj) -> bytes:
+    """Serialize results to JSON bytes, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str,
+                            option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, default=str).encode('utf-8')
+
+
+def _dumps_line(obj) -> bytes:
+    """One compact JSON line (newline-terminated) for .jsonl output"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, default=str) + "\n").encode('utf-8')
+
+
+def _loads(raw):
+    """Parse JSON bytes, using orjson when it is installed"""
+    return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+
+
+def _pdf_fingerprint(pdf_path, chunk_size=1 << 20):
+    """SHA-256 of the PDF bytes, streamed in 1 MiB chunks"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_cached_extraction(cache_path):
+    """Returns a cached extraction result, or None if missing or its JSON outputs are gone"""
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = _loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if not all(os.path.exists(p) for p in cached.get('json_files', [])):
+        return None
+    return cached
+
+
+def _store_cached_extraction(cache_path, extraction_result):
+    """Atomically writes an extraction result to the cache"""
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_dumps(extraction_result))
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def _load_report(json_path):
+    """Parse a (possibly gzip'd) report JSON file"""
+    with (gzip.open if json_path.endswith('.gz') else open)(json_path, 'rb') as f:
+        return _loads(f.read())
+
+
+# Report fields that change on every extraction of the same PDF (run time, source file name)
+VOLATILE_REPORT_KEYS = frozenset({'extraction_timestamp'})
+VOLATILE_METADATA_KEYS = frozenset({'pdf_name'})
+
+
+def _canonical_json_hash(obj):
+    """
+    MD5 of the parsed report re-serialized with sorted keys, so key order/whitespace
+    don't matter. Volatile fields are left out, so re-extracting the same report hashes the same.
+    """
+    if isinstance(obj, dict):
+        obj = {k: v for k, v in obj.items() if k not in VOLATILE_REPORT_KEYS}
+        if isinstance(obj.get('metadata'), dict):
+            obj['metadata'] = {k: v for k, v in obj['metadata'].items() if k not in VOLATILE_METADATA_KEYS}
+    return hashlib.md5(json.dumps(obj, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _cached_call(module_name, json_path, fn, cache_dir=None, data=None, output_dir=None):
+    """
+    Runs an insight generator `fn(json_path, data=data)` through an output cache keyed
+    by the canonical hash of the report. `data` is the already-parsed report, if any.
+    Cache hits are copied into `output_dir` (the module's own output folder; defaults
+    to the report's folder) so callers never get a path inside the cache.
+    Returns the output file path (or None on failure).
+    """
+    if not cache_dir:
+        return fn(json_path, data=data)
+    
+    if data is None:
+        data = _load_report(json_path)
+    insights_dir = Path(cache_dir) / "insights"
+    prefix = f"{module_name}_{_canonical_json_hash(data)}"
+    cached = next((p for p in insights_dir.glob(f"{prefix}.*") if p.suffix != '.tmp'), None)
+    if cached:
+        log.info(f"   ♻️  Reusing cached {module_name} for identical report data")
+        output_dir = Path(output_dir or Path(json_path).parent)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        input_name = Path(json_path).name.removesuffix('.gz').removesuffix('.json')
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = output_dir / f"{input_name}_{module_name}_{timestamp}{''.join(cached.suffixes)}"
+        shutil.copyfile(cached, output_path)
+        return str(output_path)
+    
+    output_path = fn(json_path, data=data)
+    if output_path:
+        # Per-call temp file, so workers caching identical reports don't share one.
+        # Caching is best-effort: a failure here must not fail the generated insight
+        cache_path = insights_dir / (prefix + ''.join(Path(output_path).suffixes))
+        try:
+            insights_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=insights_dir, suffix='.tmp')
+            os.close(fd)
+            try:
+                shutil.copyfile(output_path, tmp_path)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+        except OSError as e:
+            log.warning(f"   ⚠️  Could not cache {module_name}: {e}")
+    return output_path
+
+
+def _has_abnormal(report) -> bool:
+    """True if any parsed test is flagged or falls outside its numeric reference range"""
+    test_results = report.get('test_results', [])
+    if not test_results:
+        return True  # nothing parsed: let the LLM look at the report rather than call it normal
+    for test in test_results:
+        if test.get('abnormal') or str(test.get('flag') or '').upper() in ABNORMAL_FLAGS:
+            return True
+        value = test.get('result_value')
+        ref = test.get('reference_range') or {}
+        if value is not None and (
+            (ref.get('min') is not None and value < ref['min']) or
+            (ref.get('max') is not None and value > ref['max'])
+        ):
+            return True
+    return False
+
+
+def _write_normal_summary(medical_json):
+    """Writes the canned summary used when every result is in range; returns its path"""
+    output_path = medical_json.removesuffix('.gz').removesuffix('.json') + '_summary_normal.txt'
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(NORMAL_SUMMARY_TEXT + "\n")
+    return output_path
+
+
+def _analyse_pdf(pipeline, pdf_path, generate_insights=True, session_id=None, cache_dir=None,
+                 on_extracted=None, skip_normal=False, timestamp=None):
+    """
+    Steps 1-2 of the workflow (extraction + clinical insights) for one PDF.
+    Touches no vault state, so it is safe to run in a worker process.
+    With `cache_dir` set, extraction results are reused for byte-identical PDFs and
+    summaries/recommendations for identical report JSON.
+    `on_extracted()`, if given, is called once Step 1 succeeds (before Step 2).
+    With `skip_normal`, reports with no abnormal results get a canned summary instead of LLM calls.
+    
+    Returns:
+        Dictionary with extraction/insight results; 'status' is 'failed' if extraction failed
+    """
+    results = {
+        'pdf_path': pdf_path,
+        'pdf_name': Path(pdf_path).stem,
+        'session_id': session_id,
+        'timestamp': timestamp or datetime.now().isoformat(),
+        'status': 'success'
+    }
+    
+    # ─────────────────────────────────────────────────────────────
+    # STEP 1: PDF EXTRACTION
+    # ─────────────────────────────────────────────────────────────
+    print_step(1, "PDF Extraction & Data Structuring")
+    
+    try:
+        extraction_result = None
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, f"{_pdf_fingerprint(pdf_path)}.json")
+            extraction_result = _load_cached_extraction(cache_path)
+            if extraction_result:
+                log.info(f"♻️  Reusing cached extraction for identical PDF")
+        
+        if extraction_result is None:
+            extraction_result = pipeline.process_single_pdf(
+                pdf_path=pdf_path,
+                keep_csv=False  # Clean up intermediate CSVs
+            )
+            if cache_dir and extraction_result.get('status') == 'success':
+                _store_cached_extraction(cache_path, extraction_result)
+        
+        results['extraction'] = extraction_result
+        
+        log.info(f"✅ Extraction complete")
+        log.info(f"   Pages: {extraction_result.get('pages', 0)}")
+        log.info(f"   Tests: {extraction_result.get('test_count', 0)}")
+        log.info(f"   JSON files: {len(extraction_result.get('json_files', []))}")
+        
+        # Get medical report JSON path (scan json_files only for results cached before 'artifacts')
+        medical_json = extraction_result.get('artifacts', {}).get('medical_report')
+        if medical_json is None:
+            medical_json = next(
+                (f for f in extraction_result.get('json_files', []) if f.endswith(MEDICAL_REPORT_SUFFIXES)),
+                None
+            )
+        
+        if not medical_json:
+            log.warning("⚠️  Warning: Medical report JSON not found")
+            results['status'] = 'partial'
+        else:
+            results['medical_json'] = medical_json
+            
+    except Exception as e:
+        log.error(f"❌ Extraction failed: {e}")
+        results['status'] = 'failed'
+        results['error'] = str(e)
+        return results
+    
+    if on_extracted:
+        on_extracted()
+    
+    # ─────────────────────────────────────────────────────────────
+    # STEP 2: CLINICAL INSIGHTS (Summary & Recommendations)
+    # ─────────────────────────────────────────────────────────────
+    insight_modules = _get_insight_modules() if generate_insights and medical_json else None
+    if insight_modules:
+        SummaryModule, RecommendationModule = insight_modules
+        print_step(2, "Clinical Insights Generation")
+        
+        # Parse the report once here rather than once per insight module
+        try:
+            medical_data = _load_report(medical_json)
+        except Exception as e:
+            log.warning(f"   ⚠️  Could not pre-load {medical_json}: {e}")
+            medical_data = None
+        
+        if skip_normal and medical_data is not None and not _has_abnormal(medical_data):
+            results['summary'] = {
+                'status': 'skipped_normal',
+                'output_file': _write_normal_summary(medical_json)
+            }
+            results['recommendations'] = {'status': 'skipped_normal'}
+            log.info("   ✅ All results within reference ranges - skipped LLM insights")
+            return results
+        
+        # Summary and recommendations are independent, network-bound LLM calls: run them side by side
+        # (with echo off, so their streamed output doesn't interleave on stdout)
+        log.info("   Generating clinical summary and medical recommendations...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                'summary': executor.submit(_cached_call, 'summary', medical_json,
+                                           partial(SummaryModule.main, echo=False), cache_dir, medical_data,
+                                           SummaryModule.OUTPUT_FOLDER),
+                'recommendations': executor.submit(_cached_call, 'recommendations', medical_json,
+                                                   partial(RecommendationModule.main, echo=False),
+                                                   cache_dir, medical_data, RecommendationModule.OUTPUT_FOLDER),
+            }
+        
+        for key, label in (('summary', 'Summary'), ('recommendations', 'Recommendations')):
+            try:
+                output = futures[key].result()
+            except Exception as e:
+                log.warning(f"   ⚠️  Clinical insights error ({key}): {e}")
+                results['insights_error'] = str(e)
+                continue
+            
+            if output:
+                results[key] = {
+                    'status': 'success',
+                    'output_file': output
+                }
+                log.info(f"   ✅ {label} generated: {output}")
+            else:
+                log.warning(f"   ⚠️  {label} generation failed")
+    
+    return results
+
+
+# Per-process pipeline reused by _process_one across the PDFs a worker receives
+_WORKER_PIPELINE = None
+
+
+def _process_one(pdf_path, extractions_dir, generate_insights=True, session_id=None, cache_dir=None,
+                 skip_normal=False, timestamp=None):
+    """
+    Process-pool entry point: extraction + insights for one PDF.
+    Vault assignment is left to the parent so SmartVaultManager state stays consistent.
+    """
+    global _WORKER_PIPELINE
+    if _WORKER_PIPELINE is None:
+        _WORKER_PIPELINE = SmartMedicalReportPipeline(base_output_dir=extractions_dir)
+    if session_id:
+        # Keep every worker's extractions under the workflow's session folder
+        _WORKER_PIPELINE.session_id = session_id
+    
+    p = Path(pdf_path)
+    if not p.is_file():
+        log.error(f"❌ Error: PDF file not found: {pdf_path}")
+        return None
+    
+    log.info(f"📄 Processing: {p.name}")
+    started = perf_counter()
+    results = _analyse_pdf(_WORKER_PIPELINE, pdf_path, generate_insights, session_id, cache_dir,
+                           skip_normal=skip_normal, timestamp=timestamp)
+    results['elapsed_seconds'] = round(perf_counter() - started, 3)
+    return results
 
 
 class IntegratedWorkflow:
@@ -55,21 +456,57 @@ class IntegratedWorkflow:
     Orchestrates PDF → Extraction → Analysis → Vault Storage
     """
     
-    def __init__(self, output_dir="integrated_output"):
+    def __init__(self, output_dir="integrated_output", use_cache=True, prewarm=True, skip_normal=False):
         """Initialize workflow components"""
-        self.output_dir = output_dir
-        self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.output_dir = Path(output_dir)
+        # Skip LLM insights for reports whose results are all within range
+        self.skip_normal = skip_normal
+        self.extractions_dir = self.output_dir / EXTRACTIONS_SUBDIR
+        self.vaults_dir = self.output_dir / VAULTS_SUBDIR
+        # Extraction cache keyed by PDF SHA-256; None disables it
+        self.cache_dir = str(self.output_dir / CACHE_SUBDIR) if use_cache else None
+        # Wall clock is read once per session; per-PDF timings use perf_counter
+        self._session_started = datetime.now()
+        self.session_id = self._session_started.strftime("%Y%m%d_%H%M%S")
+        self._session_timestamp = self._session_started.isoformat()
         
         # Initialize components
-        self.pipeline = SmartMedicalReportPipeline(base_output_dir=os.path.join(output_dir, "extractions"))
-        self.vault_manager = SmartVaultManager(vault_base_dir=os.path.join(output_dir, "PatientVaults"))
+        self.pipeline = SmartMedicalReportPipeline(base_output_dir=str(self.extractions_dir))
+        self.pipeline.session_id = self.session_id
+        self.vault_manager = SmartVaultManager(vault_base_dir=str(self.vaults_dir))
+        self._vault_lock = threading.Lock()
+        self._bg = ThreadPoolExecutor(max_workers=2)  # background vault writes
         
         # Create output directories
-        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._log_queue = setup_logging()
+        
+        log.info(f"✅ Initialized Integrated Workflow")
+        log.info(f"   Session ID: {self.session_id}")
+        log.info(f"   Output Directory: {self.output_dir}")
         
-        print(f"✅ Initialized Integrated Workflow")
-        print(f"   Session ID: {self.session_id}")
-        print(f"   Output Directory: {self.output_dir}")
+        if prewarm:
+            self.prewarm()
+    
+    def prewarm(self):
+        """
+        Import the Gemini SDK and insight modules and build their GenerativeModel
+        objects up front, so the first PDF doesn't pay the import cost (forked batch
+        workers inherit the loaded modules). No API connection is opened here; the
+        first request still sets up its own channel.
+        """
+        insight_modules = _get_insight_modules()
+        if not insight_modules:
+            return
+        for module in insight_modules:
+            get_model = getattr(module, '_get_model', None)
+            if get_model is None:
+                continue
+            try:
+                for model_name in module.MODELS_TO_TRY:
+                    get_model(model_name)
+            except Exception as e:
+                log.warning(f"⚠️  Could not prewarm {module.__name__}: {e}")
     
     def process_single_pdf(self, pdf_path: str, generate_insights: bool = True):
         """
@@ -84,92 +521,60 @@ class IntegratedWorkflow:
         """
         print_header("🏥 INTEGRATED MEDICAL REPORT WORKFLOW")
         
-        if not os.path.exists(pdf_path):
-            print(f"❌ Error: PDF file not found: {pdf_path}")
+        p = Path(pdf_path)
+        if not p.is_file():
+            log.error(f"❌ Error: PDF file not found: {pdf_path}")
             return None
         
-        print(f"📄 Processing: {os.path.basename(pdf_path)}")
+        log.info(f"📄 Processing: {p.name}")
         
-        results = {
-            'pdf_path': pdf_path,
-            'pdf_name': Path(pdf_path).stem,
-            'session_id': self.session_id,
-            'timestamp': datetime.now().isoformat(),
-            'status': 'success'
-        }
+        # Vault segregation only needs the PDF: start it in the background as soon as
+        # extraction succeeds so it overlaps with the (LLM-bound) insights step
+        vault_future = None
         
-        # ─────────────────────────────────────────────────────────────
-        # STEP 1: PDF EXTRACTION
-        # ─────────────────────────────────────────────────────────────
-        print_step(1, "PDF Extraction & Data Structuring")
+        def start_vault():
+            nonlocal vault_future
+            vault_future = self._bg.submit(self._process_vault_pdf, pdf_path)
         
+        started = perf_counter()
         try:
-            extraction_result = self.pipeline.process_single_pdf(
-                pdf_path=pdf_path,
-                keep_csv=False  # Clean up intermediate CSVs
-            )
-            
-            results['extraction'] = extraction_result
-            
-            print(f"✅ Extraction complete")
-            print(f"   Pages: {extraction_result.get('pages', 0)}")
-            print(f"   Tests: {extraction_result.get('test_count', 0)}")
-            print(f"   JSON files: {len(extraction_result.get('json_files', []))}")
-            
-            # Get medical report JSON path
-            medical_json = None
-            for json_file in extraction_result.get('json_files', []):
-                if 'medical_report' in json_file:
-                    medical_json = json_file
-                    break
-            
-            if not medical_json:
-                print("⚠️  Warning: Medical report JSON not found")
-                results['status'] = 'partial'
-            else:
-                results['medical_json'] = medical_json
-                
+            results = _analyse_pdf(self.pipeline, pdf_path, generate_insights, self.session_id,
+                                   self.cache_dir, on_extracted=start_vault, skip_normal=self.skip_normal,
+                                   timestamp=self._session_timestamp)
         except Exception as e:
-            print(f"❌ Extraction failed: {e}")
-            results['status'] = 'failed'
-            results['error'] = str(e)
+            if vault_future is None:
+                raise
+            # Step 2 blew up after the vault write started: still await it below
+            log.error(f"❌ Clinical insights failed: {e}")
+            results = {
+                'pdf_path': pdf_path,
+                'pdf_name': p.stem,
+                'session_id': self.session_id,
+                'timestamp': self._session_timestamp,
+                'status': 'partial',
+                'error': str(e)
+            }
+        if results['status'] == 'failed':
+            results['elapsed_seconds'] = round(perf_counter() - started, 3)
             return results
         
-        # ─────────────────────────────────────────────────────────────
-        # STEP 2: CLINICAL INSIGHTS (Summary & Recommendations)
-        # ─────────────────────────────────────────────────────────────
-        if generate_insights and CLINICAL_AVAILABLE and medical_json:
-            print_step(2, "Clinical Insights Generation")
-            
-            try:
-                # Generate Summary
-                print("   Generating clinical summary...")
-                summary_output = SummaryModule.main(medical_json)
-                if summary_output:
-                    results['summary'] = {
-                        'status': 'success',
-                        'output_file': summary_output
-                    }
-                    print(f"   ✅ Summary generated: {summary_output}")
-                else:
-                    print(f"   ⚠️  Summary generation failed")
-                
-                # Generate Recommendations
-                print("   Generating medical recommendations...")
-                rec_output = RecommendationModule.main(medical_json)
-                if rec_output:
-                    results['recommendations'] = {
-                        'status': 'success',
-                        'output_file': rec_output
-                    }
-                    print(f"   ✅ Recommendations generated: {rec_output}")
-                else:
-                    print(f"   ⚠️  Recommendations generation failed")
-                    
-            except Exception as e:
-                print(f"   ⚠️  Clinical insights error: {e}")
-                results['insights_error'] = str(e)
+        self._assign_vault(results, vault_future)
+        self.vault_manager.flush_vaults_index()
+        results['elapsed_seconds'] = round(perf_counter() - started, 3)
+        self._print_workflow_summary(results)
         
+        return results
+    
+    def _process_vault_pdf(self, pdf_path):
+        """SmartVaultManager isn't thread-safe: serialize every vault write"""
+        with self._vault_lock:
+            return self.vault_manager.process_pdf(pdf_path, flush=False)
+    
+    def _assign_vault(self, results, vault_future=None):
+        """
+        Step 3: file the original PDF into its patient vault (updates `results` in place).
+        If the vault write was already started in the background, `vault_future` is awaited instead.
+        """
         # ─────────────────────────────────────────────────────────────
         # STEP 3: PATIENT VAULT SEGREGATION
         # ─────────────────────────────────────────────────────────────
@@ -177,84 +582,137 @@ class IntegratedWorkflow:
         
         try:
             # Process PDF - vault stores only the original PDF
-            vault_result = self.vault_manager.process_pdf(pdf_path)
+            if vault_future is not None:
+                vault_result = vault_future.result()
+            else:
+                vault_result = self._process_vault_pdf(results['pdf_path'])
             results['vault'] = vault_result
             
-            print(f"✅ Vault assignment complete")
-            print(f"   Patient: {vault_result.get('patient_name')}")
-            print(f"   Vault: {vault_result.get('vault_dir')}")
-            print(f"   New Patient: {vault_result.get('is_new_patient')}")
-            print(f"   Total Reports: {vault_result.get('total_reports')}")
-            print(f"   📄 Stored: Original PDF only")
+            log.info(f"✅ Vault assignment complete")
+            log.info(f"   Patient: {vault_result.get('patient_name')}")
+            log.info(f"   Vault: {vault_result.get('vault_dir')}")
+            log.info(f"   New Patient: {vault_result.get('is_new_patient')}")
+            log.info(f"   Total Reports: {vault_result.get('total_reports')}")
+            log.info(f"   📄 Stored: Original PDF only")
             
         except Exception as e:
-            print(f"❌ Vault segregation failed: {e}")
+            log.error(f"❌ Vault segregation failed: {e}")
             results['vault_error'] = str(e)
-        
-        # ─────────────────────────────────────────────────────────────
-        # FINAL SUMMARY
-        # ─────────────────────────────────────────────────────────────
+    
+    def _print_workflow_summary(self, results):
+        """Print the per-PDF completion summary"""
         print_header("✅ WORKFLOW COMPLETE")
         
-        print(f"📄 PDF: {results['pdf_name']}")
+        log.info(f"📄 PDF: {results['pdf_name']}")
         
         if results.get('extraction'):
             patient_info = results['extraction'].get('patient_info', {})
             demo = patient_info.get('demographics', {})
-            print(f"👤 Patient: {demo.get('name', 'N/A')}")
-            print(f"   Age/Gender: {demo.get('age', 'N/A')} / {demo.get('gender', 'N/A')}")
+            log.info(f"👤 Patient: {demo.get('name', 'N/A')}")
+            log.info(f"   Age/Gender: {demo.get('age', 'N/A')} / {demo.get('gender', 'N/A')}")
         
-        print(f"\n📊 Processing Results:")
-        print(f"   ✓ Extraction: {'Success' if results.get('extraction') else 'Failed'}")
-        print(f"   ✓ Summary: {'Generated' if results.get('summary') else 'Skipped/Failed'}")
-        print(f"   ✓ Recommendations: {'Generated' if results.get('recommendations') else 'Skipped/Failed'}")
-        print(f"   ✓ Vault Storage: {'Success' if results.get('vault') else 'Failed'}")
+        log.info(f"\n📊 Processing Results:")
+        log.info(f"   ✓ Extraction: {'Success' if results.get('extraction') else 'Failed'}")
+        def insight_status(entry):
+            if not entry:
+                return 'Skipped/Failed'
+            return 'Skipped (all results normal)' if entry.get('status') == 'skipped_normal' else 'Generated'
         
-        if results.get('vault'):
-            print(f"\n📁 Patient Vault: {results['vault'].get('vault_dir')}")
+        log.info(f"   ✓ Summary: {insight_status(results.get('summary'))}")
+        log.info(f"   ✓ Recommendations: {insight_status(results.get('recommendations'))}")
+        log.info(f"   ✓ Vault Storage: {'Success' if results.get('vault') else 'Failed'}")
         
-        print(f"\n⏱️  Session: {self.session_id}")
-        print("="*80 + "\n")
+        if results.get('vault'):
+            log.info(f"\n📁 Patient Vault: {results['vault'].get('vault_dir')}")
         
-        return results
+        log.info(f"\n⏱️  Session: {self.session_id}")
+        log.info("="*80 + "\n")
     
-    def process_multiple_pdfs(self, pdf_paths: list, generate_insights: bool = True):
+    def process_multiple_pdfs(self, pdf_paths: list, generate_insights: bool = True,
+                              batch_size: int = DEFAULT_BATCH_SIZE):
         """
         Process multiple PDFs with automatic patient segregation
         
         Args:
             pdf_paths: List of PDF file paths
             generate_insights: Generate summary and recommendations for each
+            batch_size: Max PDFs in flight at once
         
         Returns:
-            List of processing results
+            List of slim {'pdf', 'pdf_path', 'status'} records; the full per-PDF
+            results are streamed to <output_dir>/batch_results.jsonl
         """
-        print_header("🏥 BATCH PROCESSING WORKFLOW")
-        print(f"📦 Processing {len(pdf_paths)} PDF(s)\n")
-        
-        results = []
-        
-        for i, pdf_path in enumerate(pdf_paths, 1):
-            print(f"\n{'='*80}")
-            print(f"  [{i}/{len(pdf_paths)}] {os.path.basename(pdf_path)}")
-            print(f"{'='*80}\n")
-            
-            try:
-                result = self.process_single_pdf(pdf_path, generate_insights)
-                results.append(result)
-            except Exception as e:
-                print(f"❌ Error processing {pdf_path}: {e}")
-                results.append({
-                    'pdf_path': pdf_path,
-                    'status': 'failed',
-                    'error': str(e)
-                })
+        results = [
+            {
+                'pdf': Path(result['pdf_path']).stem,
+                'pdf_path': result['pdf_path'],
+                'status': result.get('status')
+            }
+            for result in self.iter_process_multiple_pdfs(pdf_paths, generate_insights, batch_size)
+        ]
         
         # Display final summary
         self._display_batch_summary(results)
         
         return results
     
+    def iter_process_multiple_pdfs(self, pdf_paths: list, generate_insights: bool = True,
+                                   batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Generator version of process_multiple_pdfs: yields each full per-PDF result
+        (in input order) as soon as its batch has settled and it has been vaulted,
+        so callers can stream results instead of waiting for the whole batch.
+        Every result is also appended to <output_dir>/batch_results.jsonl.
+        """
+        print_header("🏥 BATCH PROCESSING WORKFLOW")
+        log.info(f"📦 Processing {len(pdf_paths)} PDF(s)\n")
+        
+        # Extraction + insights are independent per PDF and GIL-heavy: fan out to processes.
+        # PDFs go in batches of `batch_size`, each settled before the next starts, which
+        # bounds concurrent LLM calls (rate limits) and the number of PDFs held in memory.
+        batch_size = max(1, batch_size)
+        max_workers = min(len(pdf_paths), batch_size, os.cpu_count() or 4) or 1
+        done = 0
+        
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_log_queue,
+                                 initargs=(self._log_queue,)) as executor, \
+                open(self.output_dir / BATCH_RESULTS_FILE, 'ab') as results_fp:
+            for start in range(0, len(pdf_paths), batch_size):
+                batch_paths = pdf_paths[start:start + batch_size]
+                batch_results = [None] * len(batch_paths)
+                futures = {
+                    executor.submit(_process_one, pdf_path, str(self.extractions_dir), generate_insights,
+                                    self.session_id, self.cache_dir, self.skip_normal,
+                                    self._session_timestamp): idx
+                    for idx, pdf_path in enumerate(batch_paths)
+                }
+                for future in as_completed(futures):
+                    idx = futures[future]
+                    pdf_path = batch_paths[idx]
+                    try:
+                        batch_results[idx] = future.result()
+                    except Exception as e:
+                        log.error(f"❌ Error processing {pdf_path}: {e}")
+                        batch_results[idx] = {
+                            'pdf_path': pdf_path,
+                            'status': 'failed',
+                            'error': str(e)
+                        }
+                    done += 1
+                    log.info(f"\n  [{done}/{len(pdf_paths)}] Finished {Path(pdf_path).name}\n")
+                
+                # Vault assignment stays sequential, in input order, in this process
+                for pdf_path, result in zip(batch_paths, batch_results):
+                    if result is None:
+                        result = {'pdf_path': pdf_path, 'status': 'failed', 'error': 'PDF file not found'}
+                    elif result.get('status') != 'failed':
+                        self._assign_vault(result)
+                        self._print_workflow_summary(result)
+                    results_fp.write(_dumps_line(result))
+                    results_fp.flush()
+                    yield result
+        self.vault_manager.flush_vaults_index()
+    
     def _display_batch_summary(self, results):
         """Display summary of batch processing"""
         print_header("📊 BATCH PROCESSING SUMMARY")
@@ -262,18 +720,17 @@ class IntegratedWorkflow:
         success_count = sum(1 for r in results if r and r.get('status') == 'success')
         total = len(results)
         
-        print(f"Total PDFs: {total}")
-        print(f"Successful: {success_count}")
-        print(f"Failed: {total - success_count}")
+        log.info(f"Total PDFs: {total}")
+        log.info(f"Successful: {success_count}")
+        log.info(f"Failed: {total - success_count}")
         
         # Patient vault summary
-        print(f"\n👥 Patient Vaults Created:")
-        patients = self.vault_manager.get_existing_patients()
-        for patient in patients:
-            print(f"   - {patient['canonical_name']}: {patient['report_count']} report(s)")
+        log.info(f"\n👥 Patient Vaults Created:")
+        for patient in self.vault_manager.get_existing_patients():
+            log.info(f"   - {patient['canonical_name']}: {patient['report_count']} report(s)")
         
-        print(f"\n📁 Output Location: {self.output_dir}")
-        print("="*80 + "\n")
+        log.info(f"\n📁 Output Location: {self.output_dir}")
+        log.info("="*80 + "\n")
     
     def get_vault_summary(self):
         """Display current vault status"""
@@ -282,6 +739,7 @@ class IntegratedWorkflow:
 
 def demo_workflow():
     """Demonstration of the integrated workflow"""
+    setup_logging()
     print_header("🎬 INTEGRATED WORKFLOW DEMONSTRATION")
     
     # Initialize workflow
@@ -294,27 +752,20 @@ def demo_workflow():
         "Extraction/pipeline_output"
     ]
     
-    sample_pdfs = []
-    for location in sample_locations:
-        if os.path.exists(location):
-            for root, dirs, files in os.walk(location):
-                for file in files:
-                    if file.endswith('.pdf'):
-                        sample_pdfs.append(os.path.join(root, file))
-                        if len(sample_pdfs) >= 3:  # Limit to 3 samples
-                            break
-                if len(sample_pdfs) >= 3:
-                    break
+    # Lazily walk the existing locations and stop as soon as MAX_SAMPLES PDFs are found
+    roots = [Path(location) for location in sample_locations if Path(location).is_dir()]
+    candidates = chain.from_iterable(root.rglob("*.pdf") for root in roots)
+    sample_pdfs = [str(p) for p in islice(candidates, MAX_SAMPLES)]
     
     if sample_pdfs:
-        print(f"Found {len(sample_pdfs)} sample PDF(s):")
+        log.info(f"Found {len(sample_pdfs)} sample PDF(s):")
         for pdf in sample_pdfs:
-            print(f"   - {os.path.basename(pdf)}")
+            log.info(f"   - {os.path.basename(pdf)}")
         
         # Process first PDF in detail
-        print("\n" + "="*80)
-        print("  Processing first PDF with full workflow...")
-        print("="*80)
+        log.info("\n" + "="*80)
+        log.info("  Processing first PDF with full workflow...")
+        log.info("="*80)
         
         result = workflow.process_single_pdf(
             sample_pdfs[0],
@@ -323,19 +774,19 @@ def demo_workflow():
         
         # If multiple PDFs, process them in batch
         if len(sample_pdfs) > 1:
-            print("\n\nProcessing remaining PDFs...")
+            log.info("\n\nProcessing remaining PDFs...")
             workflow.process_multiple_pdfs(sample_pdfs[1:], generate_insights=False)
         
         # Show vault summary
         workflow.get_vault_summary()
         
     else:
-        print("⚠️  No sample PDFs found in demo_data, data, or Extraction/pipeline_output")
-        print("\nTo test the workflow:")
-        print("1. Place PDF files in 'demo_data' folder")
-        print("2. Run: python test_integrated_workflow.py")
-        print("\nOr use the API:")
-        print("""
+        log.warning("⚠️  No sample PDFs found in demo_data, data, or Extraction/pipeline_output")
+        log.info("\nTo test the workflow:")
+        log.info("1. Place PDF files in 'demo_data' folder")
+        log.info("2. Run: python test_integrated_workflow.py")
+        log.info("\nOr use the API:")
+        log.info("""
 from test_integrated_workflow import IntegratedWorkflow
 
 workflow = IntegratedWorkflow()
@@ -361,6 +812,15 @@ Examples:
   # Skip clinical insights
   python test_integrated_workflow.py report.pdf --no-insights
   
+  # Don't spend LLM calls on reports with every result in range
+  python test_integrated_workflow.py *.pdf --allow-skip-normal
+  
+  # Force re-extraction of previously seen PDFs
+  python test_integrated_workflow.py report.pdf --no-cache
+  
+  # Limit how many PDFs are processed at once
+  python test_integrated_workflow.py *.pdf --batch-size 4
+  
   # Run demo with sample data
   python test_integrated_workflow.py --demo
         """
@@ -371,13 +831,25 @@ Examples:
     parser.add_argument('--no-insights', action='store_true', help='Skip summary/recommendations')
     parser.add_argument('--output-dir', type=str, default='integrated_output', 
                        help='Output directory')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Re-extract PDFs even if an identical one was already processed')
+    parser.add_argument('--allow-skip-normal', action='store_true',
+                       help='Skip LLM insights for reports with no abnormal results')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                       help=f'PDFs processed concurrently per batch (default: {DEFAULT_BATCH_SIZE})')
     
     args = parser.parse_args()
+    setup_logging()
     
     if args.demo or not args.pdfs:
         demo_workflow()
     else:
-        workflow = IntegratedWorkflow(output_dir=args.output_dir)
+        workflow = IntegratedWorkflow(
+            output_dir=args.output_dir,
+            use_cache=not args.no_cache,
+            prewarm=not args.no_insights,
+            skip_normal=args.allow_skip_normal
+        )
         
         if len(args.pdfs) == 1:
             workflow.process_single_pdf(
@@ -387,7 +859,8 @@ Examples:
         else:
             workflow.process_multiple_pdfs(
                 args.pdfs,
-                generate_insights=not args.no_insights
+                generate_insights=not args.no_insights,
+                batch_size=args.batch_size
             )
 
 
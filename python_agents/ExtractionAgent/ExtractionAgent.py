@@ -8,6 +8,7 @@ import os
 import sys
 import json
 import shutil
+import hashlib
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
@@ -18,6 +19,10 @@ sys.path.insert(0, os.path.dirname(__file__))
 from pdf_extraction import AdvancedPDFExtractor
 from data_structuring import CSVToStructuredJSON
 
+# Set COMPRESS_OUTPUT=1 to write the JSON artifacts gzip'd (*.json.gz)
+COMPRESS_OUTPUT = os.getenv("COMPRESS_OUTPUT", "").lower() in ("1", "true", "yes")
+JSON_SUFFIX = ".json.gz" if COMPRESS_OUTPUT else ".json"
+
 
 class SmartMedicalReportPipeline:
     """
@@ -52,8 +57,10 @@ class SmartMedicalReportPipeline:
         if output_name:
             pdf_name = output_name
         
-        # Create output directories
-        session_dir = os.path.join(self.base_output_dir, self.session_id, pdf_name)
+        # Create output directories (suffixed with a hash of the full path, so
+        # same-named PDFs from different folders don't share a directory)
+        path_hash = hashlib.md5(os.path.abspath(pdf_path).encode('utf-8')).hexdigest()[:8]
+        session_dir = os.path.join(self.base_output_dir, self.session_id, f"{pdf_name}_{path_hash}")
         csv_dir = os.path.join(session_dir, "csv")
         json_dir = os.path.join(session_dir, "json")
         
@@ -69,6 +76,7 @@ class SmartMedicalReportPipeline:
             'json_dir': json_dir,
             'csv_files': [],
             'json_files': [],
+            'artifacts': {},
             'patient_info': {},
             'test_count': 0,
             'pages': 0,
@@ -100,14 +108,16 @@ class SmartMedicalReportPipeline:
             converter = CSVToStructuredJSON(csv_dir)
             
             # Medical report JSON
-            medical_json_path = os.path.join(json_dir, f"{pdf_name}_medical_report.json")
+            medical_json_path = os.path.join(json_dir, f"{pdf_name}_medical_report{JSON_SUFFIX}")
             medical_data = converter.create_medical_report_json(medical_json_path)
             results['json_files'].append(medical_json_path)
+            results['artifacts']['medical_report'] = medical_json_path
             
             # Complete structured JSON
-            complete_json_path = os.path.join(json_dir, f"{pdf_name}_complete_data.json")
+            complete_json_path = os.path.join(json_dir, f"{pdf_name}_complete_data{JSON_SUFFIX}")
             complete_data = converter.convert_all_to_json(complete_json_path)
             results['json_files'].append(complete_json_path)
+            results['artifacts']['complete_data'] = complete_json_path
             
             # Extract summary information
             results['patient_info'] = medical_data.get('patient', {})
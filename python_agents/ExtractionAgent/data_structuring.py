@@ -8,10 +8,63 @@ import pandas as pd
 import json
 import os
 import re
+import gzip
+import io
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# A lab result row: "Test Name   [H|L] value   unit   reference   [method]"
+# Whitespace classes exclude '\n' so a MULTILINE finditer never matches across rows,
+# and the row must end on a non-blank, exactly as if each line had been strip()ped.
+# Examples:
+#   "Haemoglobin (Hb)       14.8       g/dL      13.0 - 17.0  Spectrophotometer"
+#   "Glucose (Random)               101.80       mg/dL    70 - 140"
+_TEST_ROW_PATTERN = re.compile(
+    r'^[ \t\r\f\v]*(?P<name>[A-Za-z\(\)\-\.:][A-Za-z \t\r\f\v\(\)\-\.:]*?)[ \t\r\f\v]{2,}'
+    r'(?P<flag>[HL])?[ \t\r\f\v]*(?P<value>\d+\.?\d*)[ \t\r\f\v]+'
+    r'(?P<unit>[\w/%\.\-]+(?:/[\w\.]+ ?\.?mm)?)[ \t\r\f\v]+'
+    r'(?P<reference>[\d\.\- \t\r\f\v<>]+?)'
+    r'(?:[ \t\r\f\v]{2,}(?P<method>[A-Za-z].*\S)|(?<![ \t\r\f\v]))[ \t\r\f\v]*$',
+    re.MULTILINE
+)
+
+# Upper-case header / section-title fragments; rows containing any of them are not results
+_SKIP_LITERALS = (
+    'TEST NAME', 'VALUES', 'UNITS', 'REFERENCE RANGE', 'METHOD',
+    'COMPLETE BLOOD COUNT', 'HAEMOGLOBIN', 'WHITE BLOOD CELLS',
+    'ABSOLUTE COUNTS', 'PLATELETS', 'LIPID PROFILE', 'ENGINEERING COLLEGE',
+    'END OF REPORT', 'PRINT DATE', 'DR.', 'M.D.', 'PHD', 'REG NO'
+)
+
+# Same idea for the page-level parser in parse_medical_text_content
+_CONTENT_SKIP_LITERALS = (
+    'PACKAGE', 'COMPLETE BLOOD COUNT', 'INDICES',
+    'DIFFERENTIAL', 'ABSOLUTE COUNTS', 'PLATELETS',
+    'WHITE BLOOD', 'HAEMOGLOBIN AND RBC',
+    'TEST NAME', 'PATIENT NAME', 'AGE/GENDER',
+    'CLIENT NAME', 'REFERRAL', 'SAMPLE TYPE',
+    'SCAN TO', 'PRINT DATE'
+)
+
+# Hot-path helpers for clean_text / parse_reference_range, compiled once
+_WHITESPACE_RUN = re.compile(r'\s+')
+_REF_RANGE_PATTERN = re.compile(r'(\d+\.?\d*)\s*-\s*(\d+\.?\d*)')
+
+
+def _read_csv(source) -> pd.DataFrame:
+    """Read a CSV path, or pass through a frame already loaded by from_dataframes()"""
+    if isinstance(source, pd.DataFrame):
+        return source
+    return pd.read_csv(source, encoding='utf-8-sig')
+
 
 class CSVToStructuredJSON:
     """
@@ -25,15 +78,43 @@ class CSVToStructuredJSON:
             raise FileNotFoundError(f"CSV folder not found: {csv_folder}")
         self.csv_folder = csv_folder
         
+        # Resolve the per-kind CSVs once instead of re-globbing in every extractor
+        folder = Path(csv_folder)
+        self._text_csv = next(folder.glob('*_text.csv'), None)
+        self._tables_csv = next(folder.glob('*all_tables.csv'), None)
+        self._summary_csv = next(folder.glob('*summary.csv'), None)
+    
+    @classmethod
+    def from_dataframes(cls, frames: Dict[str, Optional[pd.DataFrame]]) -> 'CSVToStructuredJSON':
+        """
+        Build a converter straight from AdvancedPDFExtractor.extract_to_dataframes()
+        output, with no CSV files on disk. Each frame goes through an in-memory CSV
+        buffer once, so values get the same types they would after to_csv/read_csv.
+        """
+        def _reload(df):
+            if df is None:
+                return None
+            return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+        
+        converter = cls.__new__(cls)
+        converter.csv_folder = None
+        converter._text_csv = _reload(frames.get('text'))
+        converter._tables_csv = _reload(frames.get('all_tables'))
+        converter._summary_csv = _reload(frames.get('summary'))
+        return converter
+        
     def clean_text(self, text: Any) -> Optional[str]:
         """Clean text by handling spaces, special chars, and formatting"""
-        if pd.isna(text) or text is None:
-            return None
+        # Strings (the common case, e.g. regex groups) can never be NA - skip pd.isna
+        if not isinstance(text, str):
+            if text is None or pd.isna(text):
+                return None
+            text = str(text)
         
-        text = str(text).strip()
+        text = text.strip()
         
         # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_RUN.sub(' ', text)
         
         # Remove leading/trailing special characters
         text = text.strip('.,;:-_')
@@ -112,19 +193,18 @@ class CSVToStructuredJSON:
         result = {'min': None, 'max': None, 'text': text}
         
         # Pattern: number - number
-        match = re.search(r'(\d+\.?\d*)\s*-\s*(\d+\.?\d*)', text)
+        # ('< number' / '> number' ranges are kept as text only, which result already holds)
+        match = _REF_RANGE_PATTERN.search(text)
         if match:
             result['min'] = float(match.group(1))
             result['max'] = float(match.group(2))
-        # Pattern: < number or > number
-        elif re.search(r'[<>]\s*(\d+\.?\d*)', text):
-            result['text'] = text
         
         return result
     
     def parse_medical_text_content(self, text: str) -> Dict[str, Any]:
         """Parse medical lab report text content into structured data"""
-        lines = [l.strip() for l in text.split('\n') if l.strip()]
+        # splitlines() also drops '\r' endings; strip each line once, not twice
+        lines = [l for l in map(str.strip, text.splitlines()) if l]
         
         result = {
             'patient_info': {},
@@ -195,12 +275,8 @@ class CSVToStructuredJSON:
             
             # Parse test results (format: Test Name   Value   Unit   Range   Method)
             # Look for lines with test data pattern
-            if not any(skip in line.upper() for skip in ['PACKAGE', 'COMPLETE BLOOD COUNT', 'INDICES', 
-                                                          'DIFFERENTIAL', 'ABSOLUTE COUNTS', 'PLATELETS',
-                                                          'WHITE BLOOD', 'HAEMOGLOBIN AND RBC',
-                                                          'TEST NAME', 'PATIENT NAME', 'AGE/GENDER',
-                                                          'CLIENT NAME', 'REFERRAL', 'SAMPLE TYPE',
-                                                          'SCAN TO', 'PRINT DATE']):
+            line_upper = line.upper()
+            if not any(skip in line_upper for skip in _CONTENT_SKIP_LITERALS):
                 
                 # Pattern: Test Name [H/L] Value Unit Range Method
                 # Split by multiple spaces (2 or more)
@@ -250,7 +326,7 @@ class CSVToStructuredJSON:
     
     def convert_text_csv_to_json(self, csv_path: str) -> Dict[str, Any]:
         """Convert text CSV to structured JSON with medical data parsing"""
-        df = pd.read_csv(csv_path, encoding='utf-8-sig')
+        df = _read_csv(csv_path)
         
         pages = []
         all_patient_info = {}
@@ -297,7 +373,7 @@ class CSVToStructuredJSON:
     
     def convert_tables_csv_to_json(self, csv_path: str) -> Dict[str, Any]:
         """Convert tables CSV to structured JSON with intelligent parsing"""
-        df = pd.read_csv(csv_path, encoding='utf-8-sig')
+        df = _read_csv(csv_path)
         
         # Group by pdf_name, page_number, table_number
         tables = []
@@ -412,7 +488,7 @@ class CSVToStructuredJSON:
     
     def convert_boxes_csv_to_json(self, csv_path: str) -> Dict[str, Any]:
         """Convert boxes CSV to structured JSON"""
-        df = pd.read_csv(csv_path, encoding='utf-8-sig')
+        df = _read_csv(csv_path)
         
         boxes = []
         for _, row in df.iterrows():
@@ -439,7 +515,7 @@ class CSVToStructuredJSON:
     
     def convert_summary_csv_to_json(self, csv_path: str) -> Dict[str, Any]:
         """Convert summary CSV to structured JSON"""
-        df = pd.read_csv(csv_path, encoding='utf-8-sig')
+        df = _read_csv(csv_path)
         
         if len(df) > 0:
             row = df.iloc[0]
@@ -511,7 +587,8 @@ class CSVToStructuredJSON:
             output_path = Path(output_file)
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(output_file, 'w', encoding='utf-8') as f:
+            opener = gzip.open if output_path.suffix == '.gz' else open
+            with opener(output_file, 'wt', encoding='utf-8') as f:
                 json.dump(result, f, indent=2, ensure_ascii=False)
             
             print(f"✅ Structured JSON saved: {output_file}")
@@ -527,11 +604,9 @@ class CSVToStructuredJSON:
             'contact': {}
         }
         
-        lines = text.split('\n')
+        lines = text.splitlines()
         
         for line in lines:
-            line_stripped = line.strip()
-            
             # Patient Name - extract only the name part before lots of spaces
             if 'Patient Name' in line:
                 match = re.search(r'Patient\s+Name\s*:\s*([A-Za-z\s\.]+?)(?:\s{5,}|\s*$)', line)
@@ -571,7 +646,7 @@ class CSVToStructuredJSON:
                     patient_info['dates']['reported'] = self.clean_text(match.group(1))
             
             # Referral
-            if 'Referral' in line_stripped:
+            if 'Referral' in line:
                 match = re.search(r'Referral\s*:\s*([A-Za-z\s]+?)(?:\s{5,}|\s*$)', line)
                 if match:
                     patient_info['contact']['referral'] = self.clean_text(match.group(1))
@@ -594,9 +669,8 @@ class CSVToStructuredJSON:
         }
         
         # First extract from text files using the new parser
-        text_file = list(Path(self.csv_folder).glob('*_text.csv'))
-        if text_file:
-            text_data = self.convert_text_csv_to_json(str(text_file[0]))
+        if self._text_csv is not None:
+            text_data = self.convert_text_csv_to_json(self._text_csv)
             parsed_info = text_data.get('patient_info', {})
             
             # Map the parsed data to our structure
@@ -627,9 +701,8 @@ class CSVToStructuredJSON:
                 patient_info['contact']['referral'] = parsed_info['referral']
         
         # Then look for patient data in tables (only if not already set)
-        tables_file = list(Path(self.csv_folder).glob('*all_tables.csv'))
-        if tables_file:
-            tables_data = self.convert_tables_csv_to_json(str(tables_file[0]))
+        if self._tables_csv is not None:
+            tables_data = self.convert_tables_csv_to_json(self._tables_csv)
             
             for table in tables_data.get('tables', []):
                 structured = table.get('structured_data', {})
@@ -670,85 +743,35 @@ class CSVToStructuredJSON:
     def extract_test_results_from_text(self, text: str) -> List[Dict[str, Any]]:
         """Extract medical test results from raw text content"""
         tests = []
-        lines = text.split('\n')
         
-        for line in lines:
-            line_stripped = line.strip()
-            if not line_stripped:
-                continue
-            
+        # The compiled pattern scans the whole text, so only candidate rows reach Python
+        for match in _TEST_ROW_PATTERN.finditer(text):
             # Skip header lines and section titles
-            if any(skip in line_stripped.upper() for skip in [
-                'TEST NAME', 'VALUES', 'UNITS', 'REFERENCE RANGE', 'METHOD',
-                'COMPLETE BLOOD COUNT', 'HAEMOGLOBIN', 'WHITE BLOOD CELLS',
-                'ABSOLUTE COUNTS', 'PLATELETS', 'LIPID PROFILE', 'ENGINEERING COLLEGE',
-                'END OF REPORT', 'PRINT DATE', 'DR.', 'M.D.', 'PHD', 'REG NO'
-            ]):
+            line_upper = match.group(0).upper()
+            if any(skip in line_upper for skip in _SKIP_LITERALS):
                 continue
             
-            # Pattern 1: Test name with spaces, then value (possibly with H/L flag), then unit, then reference, then method
-            # Example: "Haemoglobin (Hb)       14.8       g/dL      13.0 - 17.0  Spectrophotometer"
-            # Unit: non-greedy match up to 2+ spaces or digits (start of reference)
-            match = re.match(
-                r'^([A-Za-z\s\(\)\-\.:]+?)\s{2,}([HL])?\s*(\d+\.?\d*)\s+([\w/%\.\-]+(?:/[\w\.]+ ?\.?mm)?)\s+([\d\.\s\-<>]+?)\s{2,}([A-Za-z].+)$',
-                line_stripped
-            )
+            flag = match.group('flag')
+            value = match.group('value')
             
-            if match:
-                test_name = self.clean_text(match.group(1))
-                flag = match.group(2)
-                value = match.group(3)
-                unit = self.clean_text(match.group(4))
-                reference = self.clean_text(match.group(5))
-                method = self.clean_text(match.group(6))
-                
-                test = {
-                    'test_name': test_name,
-                    'result_value': float(value) if value else None,
-                    'result_text': value,
-                    'unit': unit,
-                    'reference_range': self.parse_reference_range(reference),
-                    'method': method
-                }
-                
-                if flag:
-                    test['flag'] = 'High' if flag == 'H' else 'Low'
-                    test['abnormal'] = True
-                else:
-                    test['abnormal'] = False
-                
-                tests.append(test)
-                continue
+            test = {
+                'test_name': self.clean_text(match.group('name')),
+                'result_value': float(value) if value else None,
+                'result_text': value,
+                'unit': self.clean_text(match.group('unit')),
+                'reference_range': self.parse_reference_range(self.clean_text(match.group('reference')))
+            }
             
-            # Pattern 2: Without method field
-            # Example: "Glucose (Random)               101.80       mg/dL    70 - 140"
-            match = re.match(
-                r'^([A-Za-z\s\(\)\-\.:]+?)\s{2,}([HL])?\s*(\d+\.?\d*)\s+([\w/%\.\-]+(?:/[\w\.]+ ?\.?mm)?)\s+([\d\.\s\-<>]+)\s*$',
-                line_stripped
-            )
+            if match.group('method') is not None:
+                test['method'] = self.clean_text(match.group('method'))
             
-            if match:
-                test_name = self.clean_text(match.group(1))
-                flag = match.group(2)
-                value = match.group(3)
-                unit = self.clean_text(match.group(4))
-                reference = self.clean_text(match.group(5))
-                
-                test = {
-                    'test_name': test_name,
-                    'result_value': float(value) if value else None,
-                    'result_text': value,
-                    'unit': unit,
-                    'reference_range': self.parse_reference_range(reference)
-                }
-                
-                if flag:
-                    test['flag'] = 'High' if flag == 'H' else 'Low'
-                    test['abnormal'] = True
-                else:
-                    test['abnormal'] = False
-                
-                tests.append(test)
+            if flag:
+                test['flag'] = 'High' if flag == 'H' else 'Low'
+                test['abnormal'] = True
+            else:
+                test['abnormal'] = False
+            
+            tests.append(test)
         
         return tests
     
@@ -757,16 +780,14 @@ class CSVToStructuredJSON:
         all_tests = []
         
         # First try to extract from text files using the new parser
-        text_file = list(Path(self.csv_folder).glob('*_text.csv'))
-        if text_file:
-            text_data = self.convert_text_csv_to_json(str(text_file[0]))
+        if self._text_csv is not None:
+            text_data = self.convert_text_csv_to_json(self._text_csv)
             # Get test results from the parsed data
             all_tests.extend(text_data.get('test_results', []))
         
         # Then look for test results in tables as backup
-        tables_file = list(Path(self.csv_folder).glob('*all_tables.csv'))
-        if tables_file:
-            tables_data = self.convert_tables_csv_to_json(str(tables_file[0]))
+        if self._tables_csv is not None:
+            tables_data = self.convert_tables_csv_to_json(self._tables_csv)
             
             for table in tables_data.get('tables', []):
                 tests = table.get('medical_tests', [])
@@ -792,17 +813,15 @@ class CSVToStructuredJSON:
         }
         
         # Add doctor information from text
-        text_file = list(Path(self.csv_folder).glob('*_text.csv'))
-        if text_file:
-            text_data = self.convert_text_csv_to_json(str(text_file[0]))
+        if self._text_csv is not None:
+            text_data = self.convert_text_csv_to_json(self._text_csv)
             doctor_info = text_data.get('doctor_info', {})
             if doctor_info:
                 report['doctor'] = doctor_info
         
         # Add summary data
-        summary_file = list(Path(self.csv_folder).glob('*summary.csv'))
-        if summary_file:
-            summary_data = self.convert_summary_csv_to_json(str(summary_file[0]))
+        if self._summary_csv is not None:
+            summary_data = self.convert_summary_csv_to_json(self._summary_csv)
             report['metadata'] = summary_data.get('statistics', {})
             report['metadata']['pdf_name'] = summary_data.get('pdf_name')
         
@@ -811,8 +830,19 @@ class CSVToStructuredJSON:
             output_path = Path(output_file)
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(report, f, indent=2, ensure_ascii=False)
+            # Write next to the target and rename, so readers never see a half-written report
+            tmp_path = output_path.with_suffix(output_path.suffix + '.tmp')
+            opener = gzip.open if output_path.suffix == '.gz' else open
+            if ORJSON_AVAILABLE:
+                with opener(tmp_path, 'wb') as f:
+                    f.write(orjson.dumps(
+                        report,
+                        option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                    ))
+            else:
+                with opener(tmp_path, 'wt', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, output_path)
             
             print(f"✅ Medical report JSON saved: {output_file}")
         
@@ -7,7 +7,7 @@ import pdfplumber
 import pandas as pd
 import os
 import re
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from pathlib import Path
 
 
@@ -93,7 +93,7 @@ class AdvancedPDFExtractor:
             print(f"Warning: Rectangle detection failed - {e}")
         return rectangles
     
-    def extract_all_text(self) -> Dict[str, any]:
+    def extract_all_text(self) -> Dict[str, Any]:
         """
         Extract all content from PDF
         Returns a dictionary with pages, text, tables, and metadata
@@ -135,28 +135,19 @@ class AdvancedPDFExtractor:
         
         return result
     
-    def extract_to_csv(self, output_dir: str = None, 
-                      separate_tables: bool = True) -> Dict[str, str]:
+    def extract_to_dataframes(self) -> Dict[str, Any]:
         """
-        Extract PDF content and save to CSV files
+        Extract PDF content into in-memory DataFrames (the same data extract_to_csv writes)
         
-        Args:
-            output_dir: Directory to save CSV files (default: same as PDF)
-            separate_tables: If True, save each table as separate CSV
-            
         Returns:
-            Dictionary with paths to created CSV files
+            Dictionary with 'text', 'all_tables', 'boxes' and 'summary' DataFrames
+            ('all_tables'/'boxes' are None when the PDF has none), plus 'tables':
+            a list of (page_number, table_number, DataFrame) for each table
         """
-        if output_dir is None:
-            output_dir = os.path.dirname(self.pdf_path)
-        
-        os.makedirs(output_dir, exist_ok=True)
-        
         # Extract all content
         content = self.extract_all_text()
-        output_files = {}
         
-        # 1. Create main text CSV (page-by-page)
+        # 1. Main text (page-by-page)
         text_data = []
         for page in content['pages']:
             text_data.append({
@@ -167,46 +158,17 @@ class AdvancedPDFExtractor:
                 'box_count': page['box_count']
             })
         
-        text_df = pd.DataFrame(text_data)
-        text_csv_path = os.path.join(output_dir, f"{self.pdf_name}_text.csv")
-        text_df.to_csv(text_csv_path, index=False, encoding='utf-8-sig')
-        output_files['text_csv'] = text_csv_path
-        print(f"✅ Text CSV saved: {text_csv_path}")
-        
-        # 2. Extract and save all tables
-        all_tables = []
-        table_count = 0
-        
+        # 2. All tables, tagged with where they came from
+        tables = []
         for page in content['pages']:
             for table_idx, table_df in enumerate(page['tables']):
-                table_count += 1
-                
                 # Add metadata columns
                 table_df.insert(0, 'pdf_name', self.pdf_name)
                 table_df.insert(1, 'page_number', page['page_number'])
                 table_df.insert(2, 'table_number', table_idx + 1)
-                
-                if separate_tables:
-                    # Save each table separately
-                    table_csv_path = os.path.join(
-                        output_dir, 
-                        f"{self.pdf_name}_table_p{page['page_number']}_t{table_idx + 1}.csv"
-                    )
-                    table_df.to_csv(table_csv_path, index=False, encoding='utf-8-sig')
-                    output_files[f'table_{table_count}'] = table_csv_path
-                    print(f"✅ Table CSV saved: {table_csv_path}")
-                
-                all_tables.append(table_df)
-        
-        # 3. Save combined tables CSV
-        if all_tables:
-            combined_tables_df = pd.concat(all_tables, ignore_index=True)
-            combined_csv_path = os.path.join(output_dir, f"{self.pdf_name}_all_tables.csv")
-            combined_tables_df.to_csv(combined_csv_path, index=False, encoding='utf-8-sig')
-            output_files['all_tables_csv'] = combined_csv_path
-            print(f"✅ Combined tables CSV saved: {combined_csv_path}")
+                tables.append((page['page_number'], table_idx + 1, table_df))
         
-        # 4. Save boxes/rectangles information
+        # 3. Boxes/rectangles information
         boxes_data = []
         for page in content['pages']:
             for rect in page['rectangles']:
@@ -220,24 +182,78 @@ class AdvancedPDFExtractor:
                     'height': rect['height']
                 })
         
-        if boxes_data:
-            boxes_df = pd.DataFrame(boxes_data)
-            boxes_csv_path = os.path.join(output_dir, f"{self.pdf_name}_boxes.csv")
-            boxes_df.to_csv(boxes_csv_path, index=False, encoding='utf-8-sig')
-            output_files['boxes_csv'] = boxes_csv_path
-            print(f"✅ Boxes CSV saved: {boxes_csv_path}")
-        
-        # 5. Create summary CSV
+        # 4. Summary
         summary_data = {
             'pdf_name': [self.pdf_name],
             'total_pages': [content['total_pages']],
-            'total_tables': [table_count],
+            'total_tables': [len(tables)],
             'total_boxes': [len(boxes_data)],
             'total_words': [sum(page['word_count'] for page in content['pages'])]
         }
-        summary_df = pd.DataFrame(summary_data)
+        
+        return {
+            'text': pd.DataFrame(text_data),
+            'tables': tables,
+            'all_tables': pd.concat([t[2] for t in tables], ignore_index=True) if tables else None,
+            'boxes': pd.DataFrame(boxes_data) if boxes_data else None,
+            'summary': pd.DataFrame(summary_data)
+        }
+    
+    def extract_to_csv(self, output_dir: str = None, 
+                      separate_tables: bool = True) -> Dict[str, str]:
+        """
+        Extract PDF content and save to CSV files
+        
+        Args:
+            output_dir: Directory to save CSV files (default: same as PDF)
+            separate_tables: If True, save each table as separate CSV
+            
+        Returns:
+            Dictionary with paths to created CSV files
+        """
+        if output_dir is None:
+            output_dir = os.path.dirname(self.pdf_path)
+        
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Extract all content
+        frames = self.extract_to_dataframes()
+        output_files = {}
+        
+        # 1. Create main text CSV (page-by-page)
+        text_csv_path = os.path.join(output_dir, f"{self.pdf_name}_text.csv")
+        frames['text'].to_csv(text_csv_path, index=False, encoding='utf-8-sig')
+        output_files['text_csv'] = text_csv_path
+        print(f"✅ Text CSV saved: {text_csv_path}")
+        
+        # 2. Save each table separately
+        if separate_tables:
+            for table_count, (page_number, table_number, table_df) in enumerate(frames['tables'], start=1):
+                table_csv_path = os.path.join(
+                    output_dir, 
+                    f"{self.pdf_name}_table_p{page_number}_t{table_number}.csv"
+                )
+                table_df.to_csv(table_csv_path, index=False, encoding='utf-8-sig')
+                output_files[f'table_{table_count}'] = table_csv_path
+                print(f"✅ Table CSV saved: {table_csv_path}")
+        
+        # 3. Save combined tables CSV
+        if frames['all_tables'] is not None:
+            combined_csv_path = os.path.join(output_dir, f"{self.pdf_name}_all_tables.csv")
+            frames['all_tables'].to_csv(combined_csv_path, index=False, encoding='utf-8-sig')
+            output_files['all_tables_csv'] = combined_csv_path
+            print(f"✅ Combined tables CSV saved: {combined_csv_path}")
+        
+        # 4. Save boxes/rectangles information
+        if frames['boxes'] is not None:
+            boxes_csv_path = os.path.join(output_dir, f"{self.pdf_name}_boxes.csv")
+            frames['boxes'].to_csv(boxes_csv_path, index=False, encoding='utf-8-sig')
+            output_files['boxes_csv'] = boxes_csv_path
+            print(f"✅ Boxes CSV saved: {boxes_csv_path}")
+        
+        # 5. Create summary CSV
         summary_csv_path = os.path.join(output_dir, f"{self.pdf_name}_summary.csv")
-        summary_df.to_csv(summary_csv_path, index=False, encoding='utf-8-sig')
+        frames['summary'].to_csv(summary_csv_path, index=False, encoding='utf-8-sig')
         output_files['summary_csv'] = summary_csv_path
         print(f"✅ Summary CSV saved: {summary_csv_path}")
         
@@ -1,8 +1,17 @@
 import sys
 import json
 import os
+import hashlib
+import gzip
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-import google.generativeai as genai
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # --- CONFIGURATION ---
 # Get API Key from environment variable (passed from Node.js or set in .env)
@@ -13,6 +22,9 @@ if not api_key:
 
 OUTPUT_FOLDER = "medical_recommendations"
 
+# Set COMPRESS_OUTPUT=1 to write gzip'd artifacts (*.gz); consumers must read them with gzip
+COMPRESS_OUTPUT = os.getenv("COMPRESS_OUTPUT", "").lower() in ("1", "true", "yes")
+
 # List of models to try in order (fallback system)
 MODELS_TO_TRY = [
     'gemini-2.5-flash',           # Latest, most capable
@@ -21,94 +33,273 @@ MODELS_TO_TRY = [
     'gemini-2.5-flash-lite',      # Alternative lite version
 ]
 
-def get_medical_recommendations(json_data):
+# Seconds to wait on the models already asked before also trying the next one
+# (thinking models can take a while to send their first chunk); 0 disables hedging,
+# so the next model is only tried after an error
+MODEL_HEDGE_DELAY = float(os.getenv("MODEL_HEDGE_DELAY", "30"))
+
+def _loads(raw):
+    """Parse JSON bytes, using orjson when it is installed"""
+    return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+
+def _dumps_pretty(obj):
+    """Indented JSON text for the prompt, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, indent=2)
+
+def _open_output(path):
+    """Opens the output file for text writing, gzip'd when the path ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(path, 'w', encoding='utf-8')
+
+def _emit(text, stream_to=None, echo=True):
+    """Echo a streamed chunk to stdout (unless `echo` is off) and, if given, the open output file"""
+    if echo:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    if stream_to:
+        stream_to.write(text)
+        stream_to.flush()
+
+def _cache_path(model_name, prompt):
+    """Content-addressed cache file for a (model, prompt) pair"""
+    key = hashlib.blake2b((model_name + '\x00' + prompt).encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(OUTPUT_FOLDER, '.cache', f'{key}.md')
+
+def _read_cache(prompt):
+    """Returns (model_name, text) for a cached response to this prompt, else None"""
+    for model_name in MODELS_TO_TRY:
+        cache_path = _cache_path(model_name, prompt)
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return model_name, f.read()
+    return None
+
+def _write_cache(model_name, prompt, text):
+    """
+    Stores a successful response so identical prompts skip the API next time
+    Written to a temp file and renamed into place, so readers never see a partial entry
+    """
+    cache_path = _cache_path(model_name, prompt)
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def _slim_lab_data(lab_data):
+    """
+    Shrinks the report before it goes into the prompt: keeps the patient block
+    and abnormal results in full, normal results by name only.
+    """
+    if not isinstance(lab_data, dict):
+        return lab_data
+    test_results = lab_data.get('test_results', [])
+    return {
+        'patient': lab_data.get('patient'),
+        'abnormal_tests': [t for t in test_results if t.get('abnormal')],
+        'all_test_names': [t.get('test_name') for t in test_results],
+    }
+
+# One GenerativeModel per model name, shared by every call in this process
+_MODEL_CACHE = {}
+
+def _get_model(model_name):
+    """Returns the shared GenerativeModel for model_name, configuring the SDK on first use"""
+    model = _MODEL_CACHE.get(model_name)
+    if model is None:
+        # Only pay for the SDK import (grpc, protobuf, auth) once we really call the API
+        import google.generativeai as genai
+        if not _MODEL_CACHE:
+            genai.configure(api_key=api_key)
+        model = _MODEL_CACHE[model_name] = genai.GenerativeModel(model_name)
+    return model
+
+def _open_stream(model_name, prompt):
+    """Start a streamed generation; returns once the model has sent its first chunk"""
+    response = _get_model(model_name).generate_content(prompt, stream=True)
+    return model_name, response
+
+def _discard(future):
+    """Done-callback for attempts that lost the race: close the unused stream without reading it"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    _, response = future.result()
+    # The SDK response has no public close(); cancel the underlying gRPC stream when it's exposed,
+    # otherwise the reference is simply dropped
+    close = getattr(response, 'close', None) or getattr(getattr(response, '_iterator', None), 'cancel', None)
+    if close:
+        try:
+            close()
+        except Exception:
+            pass
+
+def _race_models(prompt, stream_to=None, echo=True):
+    """
+    Asks the models in MODELS_TO_TRY order, each on its own thread, and streams
+    the first one to answer. The next model is only started when one fails or
+    nothing has answered within MODEL_HEDGE_DELAY seconds, so a healthy first
+    model costs a single request. Attempts that lose are cancelled or closed unread.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(MODELS_TO_TRY))
+    remaining = list(MODELS_TO_TRY)
+    names = {}
+    pending = set()
+    winner = None
+    first_error = None
+
+    def launch():
+        model_name = remaining.pop(0)
+        future = executor.submit(_open_stream, model_name, prompt)
+        names[future] = model_name
+        pending.add(future)
+
+    try:
+        launch()
+        while pending and winner is None:
+            hedge = remaining and MODEL_HEDGE_DELAY > 0
+            done, _ = wait(pending, timeout=MODEL_HEDGE_DELAY if hedge else None,
+                           return_when=FIRST_COMPLETED)
+            pending.difference_update(done)
+            if not done:
+                # Nobody has answered yet: hedge with the next model
+                launch()
+                continue
+            for future in done:
+                if future.exception() is None:
+                    if winner is None:
+                        winner = future.result()
+                    else:
+                        _discard(future)
+                    continue
+                model_name = names[future]
+                error_msg = str(future.exception())
+                if "429" in error_msg or "quota" in error_msg.lower():
+                    print(f"⚠️  Quota exceeded for {model_name}, trying next model...")
+                elif "404" in error_msg or "not found" in error_msg.lower():
+                    print(f"⚠️  Model {model_name} not available, trying next model...")
+                elif first_error is None:
+                    first_error = (model_name, error_msg)
+                if winner is None and remaining:
+                    launch()
+    finally:
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(_discard)
+        executor.shutdown(wait=False)
+
+    if winner is None:
+        if first_error:
+            return f"Error connecting to AI ({first_error[0]}): {first_error[1]}"
+        return "❌ All Gemini models exceeded quota or unavailable. Please try again later."
+
+    model_name, response = winner
+    if echo:
+        print(f"✅ Using model: {model_name}")
+    chunks = []
+    try:
+        for chunk in response:
+            chunks.append(chunk.text)
+            _emit(chunk.text, stream_to, echo)
+    except Exception as e:
+        return f"Error connecting to AI ({model_name}): {str(e)}"
+    if echo:
+        print()
+    text = "".join(chunks)
+    _write_cache(model_name, prompt, text)
+    return text
+
+def get_medical_recommendations(json_data, stream_to=None, echo=True):
     """
     Sends lab data to Gemini with a 'Clinical Decision Support' persona.
     Focuses on Dos, Don'ts, and Specific Food Interventions.
+    Fallback models are tried (and hedged on slow answers) by _race_models and
+    the winner is streamed: chunks are echoed (and written to `stream_to`) as they arrive.
+    Pass echo=False to only write to `stream_to` (e.g. when several reports run at once).
     """
     if not api_key:
         return "❌ Error: API Key is missing. Please set GOOGLE_API_KEY environment variable."
 
-    genai.configure(api_key=api_key)
+    # --- THE PROMPT: CLINICAL INTELLIGENCE & DIET STRATEGY ---
+    prompt = f"""
+    You are 'MedRecAgent', a highly advanced Clinical Decision Support System.
     
-    # Try each model in sequence
-    for model_name in MODELS_TO_TRY:
-        try:
-            print(f"🔄 Trying model: {model_name}")
-            model = genai.GenerativeModel(model_name)
-
-            # --- THE PROMPT: CLINICAL INTELLIGENCE & DIET STRATEGY ---
-            prompt = f"""
-            You are 'MedRecAgent', a highly advanced Clinical Decision Support System.
-            
-            YOUR GOAL: 
-            Analyze the patient's lab report and generate a **strict, safety-focused Action Protocol**.
-            
-            CRITICAL INSTRUCTION: 
-            You must be highly specific. Do not just say "eat healthy." 
-            You must recommend specific foods that chemically interact with the patient's specific abnormal markers.
-
-            INPUT LAB DATA:
-            {json.dumps(json_data, indent=2)}
-
-            --- OUTPUT STRUCTURE (Use Markdown) ---
-
-            ## 🏥 Clinical Status Snapshot
-            (1 bullet point summarizing the primary concern. e.g., "Patient indicates pre-diabetic markers with elevated liver enzymes.")
-
-            ## 📋 The Protocol: Immediate Actions
-            
-            ### ✅ WHAT TO DO (Protective Actions)
-            *List 3 specific, science-backed lifestyle/supplement interventions.*
-            * **Lifestyle:** (e.g., "Implement 'Zone 2' cardio training to assist with lipid oxidation.")
-            * **Supplementation:** (e.g., "Consider Vitamin D3 + K2 due to low levels.")
-
-            ### ⛔ WHAT TO AVOID (Contraindications)
-            *This is CRITICAL. Tell them what behaviors/foods will spike their bad numbers.*
-            * **Dietary Hazards:** (e.g., "Strictly limit fructose and alcohol as your Uric Acid is elevated.")
-            * **Lifestyle Risks:** (e.g., "Avoid high-intensity lifting until blood pressure stabilizes.")
-
-            ## 🥗 Top Food Recommendations (Personalized)
-            *Based on your specific blood markers, incorporate these 5 Superfoods into your diet this week:*
-            
-            1. **[Specific Food Item]**: (Why? e.g., "Rich in Omega-3s to lower your high Triglycerides.")
-            2. **[Specific Food Item]**: (Why? e.g., "Contains nitrates to help lower your Blood Pressure.")
-            3. **[Specific Food Item]**: (Why? e.g., "High in soluble fiber to bind to your excess LDL Cholesterol.")
-            4. **[Specific Food Item]**: (Why?)
-            5. **[Specific Food Item]**: (Why?)
-
-            ## 🔬 Deep Medical Intelligence (Correlations)
-            *Explain ONE hidden connection in their data.*
-            (e.g., "Your High TSH combined with High Cholesterol is a classic pattern. Treating the Thyroid often lowers the Cholesterol automatically.")
-
-            ## 🩺 Next Clinical Steps
-            * "Re-test [Test Name] in [Number] weeks."
-            * "Schedule appointment with [Specialist Type]."
-
-            ---
-            **DISCLAIMER:** *I am an AI Recommendation Agent, not a doctor. This report is for educational purposes and should be reviewed by a certified medical professional before starting any new treatment.*
-            """
-
-            response = model.generate_content(prompt)
-            print(f"✅ Successfully used model: {model_name}")
-            return response.text
-        
-        except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "quota" in error_msg.lower():
-                print(f"⚠️  Quota exceeded for {model_name}, trying next model...")
-                continue 
-            elif "404" in error_msg or "not found" in error_msg.lower():
-                print(f"⚠️  Model {model_name} not available, trying next...")
-                continue 
-            else:
-                return f"Error connecting to AI ({model_name}): {str(e)}"
+    YOUR GOAL: 
+    Analyze the patient's lab report and generate a **strict, safety-focused Action Protocol**.
+    
+    CRITICAL INSTRUCTION: 
+    You must be highly specific. Do not just say "eat healthy." 
+    You must recommend specific foods that chemically interact with the patient's specific abnormal markers.
+
+    INPUT LAB DATA:
+    {_dumps_pretty(json_data)}
+
+    --- OUTPUT STRUCTURE (Use Markdown) ---
+
+    ## 🏥 Clinical Status Snapshot
+    (1 bullet point summarizing the primary concern. e.g., "Patient indicates pre-diabetic markers with elevated liver enzymes.")
+
+    ## 📋 The Protocol: Immediate Actions
+    
+    ### ✅ WHAT TO DO (Protective Actions)
+    *List 3 specific, science-backed lifestyle/supplement interventions.*
+    * **Lifestyle:** (e.g., "Implement 'Zone 2' cardio training to assist with lipid oxidation.")
+    * **Supplementation:** (e.g., "Consider Vitamin D3 + K2 due to low levels.")
+
+    ### ⛔ WHAT TO AVOID (Contraindications)
+    *This is CRITICAL. Tell them what behaviors/foods will spike their bad numbers.*
+    * **Dietary Hazards:** (e.g., "Strictly limit fructose and alcohol as your Uric Acid is elevated.")
+    * **Lifestyle Risks:** (e.g., "Avoid high-intensity lifting until blood pressure stabilizes.")
+
+    ## 🥗 Top Food Recommendations (Personalized)
+    *Based on your specific blood markers, incorporate these 5 Superfoods into your diet this week:*
     
-    return "❌ All Gemini models exceeded quota or unavailable. Please try again later."
+    1. **[Specific Food Item]**: (Why? e.g., "Rich in Omega-3s to lower your high Triglycerides.")
+    2. **[Specific Food Item]**: (Why? e.g., "Contains nitrates to help lower your Blood Pressure.")
+    3. **[Specific Food Item]**: (Why? e.g., "High in soluble fiber to bind to your excess LDL Cholesterol.")
+    4. **[Specific Food Item]**: (Why?)
+    5. **[Specific Food Item]**: (Why?)
 
-def main(file_path=None):
+    ## 🔬 Deep Medical Intelligence (Correlations)
+    *Explain ONE hidden connection in their data.*
+    (e.g., "Your High TSH combined with High Cholesterol is a classic pattern. Treating the Thyroid often lowers the Cholesterol automatically.")
+
+    ## 🩺 Next Clinical Steps
+    * "Re-test [Test Name] in [Number] weeks."
+    * "Schedule appointment with [Specialist Type]."
+
+    ---
+    **DISCLAIMER:** *I am an AI Recommendation Agent, not a doctor. This report is for educational purposes and should be reviewed by a certified medical professional before starting any new treatment.*
+    """
+
+    # Identical prompt already answered? Replay it instead of calling the API
+    cached = _read_cache(prompt)
+    if cached:
+        model_name, text = cached
+        if echo:
+            print(f"♻️  Using cached response from {model_name}")
+        _emit(text, stream_to, echo)
+        if echo:
+            print()
+        return text
+
+    # Try the fallback models in order; the first to start answering wins
+    return _race_models(prompt, stream_to, echo)
+
+def main(file_path=None, data=None, echo=True):
     """
     Main function to generate medical recommendations.
+    Pass `data` (the already-parsed report) to skip re-reading `file_path`;
+    the path is then only used to name the output.
+    With echo=False the streamed response and progress banners aren't printed
+    (for callers running several agents side by side); errors still are.
     Returns the output file path if successful, None otherwise.
     """
     # 1. Validate Input
@@ -119,43 +310,50 @@ def main(file_path=None):
             return None
         file_path = sys.argv[1]
 
-    if not os.path.exists(file_path):
-        print(f"\n❌ Error: File not found: {file_path}")
-        return None
+    # 2. Load Data (skipped when the caller already parsed it)
+    if data is not None:
+        lab_data = data
+    else:
+        if not os.path.exists(file_path):
+            print(f"\n❌ Error: File not found: {file_path}")
+            return None
 
-    # 2. Load Data
-    print(f"\n📂 Loading report: {file_path}...")
-    try:
-        with open(file_path, 'r') as f:
-            lab_data = json.load(f)
-    except Exception as e:
-        print(f"❌ Error reading JSON: {e}")
-        return None
+        if echo:
+            print(f"\n📂 Loading report: {file_path}...")
+        try:
+            with (gzip.open if file_path.endswith('.gz') else open)(file_path, 'rb') as f:
+                lab_data = _loads(f.read())
+        except Exception as e:
+            print(f"❌ Error reading JSON: {e}")
+            return None
 
-    # 3. Run Analysis
-    print("🧠 MedRecAgent is formulating the protocol... (This uses deep reasoning)")
-    report = get_medical_recommendations(lab_data)
+    # 3. Run Analysis (streamed straight into the output file)
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+    input_name = os.path.splitext(os.path.basename(file_path).removesuffix('.gz'))[0]
+    output_filename = f"PROTOCOL_{input_name}_{timestamp}.md"
+    output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+    if COMPRESS_OUTPUT:
+        output_path += '.gz'
+
+    if echo:
+        print("🧠 MedRecAgent is formulating the protocol... (This uses deep reasoning)")
+        print("\n" + "="*60)
+    with _open_output(output_path) as f:
+        report = get_medical_recommendations(_slim_lab_data(lab_data), stream_to=f, echo=echo)
+    if echo:
+        print("="*60)
     
     if not report or report.startswith("❌") or report.startswith("Error"):
+        os.remove(output_path)
         print("❌ Failed to generate recommendations")
         if report:
             print(report)
         return None
 
-    # 4. Save & Print
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
-    input_name = os.path.splitext(os.path.basename(file_path))[0]
-    output_filename = f"PROTOCOL_{input_name}_{timestamp}.md"
-    output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(report)
-
-    print("\n" + "="*60)
-    print(report)
-    print("="*60)
-    print(f"\n✅ Medical Protocol saved to: {output_path}\n")
+    # 4. Done
+    if echo:
+        print(f"\n✅ Medical Protocol saved to: {output_path}\n")
     
     return output_path
 
@@ -1,8 +1,17 @@
 import sys
 import json
 import os
+import hashlib
+import gzip
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-import google.generativeai as genai
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # --- CONFIGURATION ---
 # Get API Key from environment variable (passed from Node.js or set in .env)
@@ -13,6 +22,9 @@ if not API_KEY:
 
 OUTPUT_FOLDER = "summary_output"
 
+# Set COMPRESS_OUTPUT=1 to write gzip'd artifacts (*.gz); consumers must read them with gzip
+COMPRESS_OUTPUT = os.getenv("COMPRESS_OUTPUT", "").lower() in ("1", "true", "yes")
+
 # List of models to try in order (fallback system)
 MODELS_TO_TRY = [
     'gemini-2.5-flash',           # Latest, most capable
@@ -21,88 +33,264 @@ MODELS_TO_TRY = [
     'gemini-2.5-flash-lite',      # Alternative lite version
 ]
 
-def get_clinical_insight(json_data):
+# Seconds to wait on the models already asked before also trying the next one
+# (thinking models can take a while to send their first chunk); 0 disables hedging,
+# so the next model is only tried after an error
+MODEL_HEDGE_DELAY = float(os.getenv("MODEL_HEDGE_DELAY", "30"))
+
+def _loads(raw):
+    """Parse JSON bytes, using orjson when it is installed"""
+    return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+
+def _dumps_pretty(obj):
+    """Indented JSON text for the prompt, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, indent=2)
+
+def _open_output(path):
+    """Opens the output file for text writing, gzip'd when the path ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(path, 'w', encoding='utf-8')
+
+def _emit(text, stream_to=None, echo=True):
+    """Echo a streamed chunk to stdout (unless `echo` is off) and, if given, the open output file"""
+    if echo:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    if stream_to:
+        stream_to.write(text)
+        stream_to.flush()
+
+def _cache_path(model_name, prompt):
+    """Content-addressed cache file for a (model, prompt) pair"""
+    key = hashlib.blake2b((model_name + '\x00' + prompt).encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(OUTPUT_FOLDER, '.cache', f'{key}.md')
+
+def _read_cache(prompt):
+    """Returns (model_name, text) for a cached response to this prompt, else None"""
+    for model_name in MODELS_TO_TRY:
+        cache_path = _cache_path(model_name, prompt)
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return model_name, f.read()
+    return None
+
+def _write_cache(model_name, prompt, text):
+    """
+    Stores a successful response so identical prompts skip the API next time
+    Written to a temp file and renamed into place, so readers never see a partial entry
+    """
+    cache_path = _cache_path(model_name, prompt)
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def _slim_lab_data(lab_data):
+    """
+    Shrinks the report before it goes into the prompt: keeps the patient block
+    and abnormal results in full, normal results by name only.
+    """
+    if not isinstance(lab_data, dict):
+        return lab_data
+    test_results = lab_data.get('test_results', [])
+    return {
+        'patient': lab_data.get('patient'),
+        'abnormal_tests': [t for t in test_results if t.get('abnormal')],
+        'all_test_names': [t.get('test_name') for t in test_results],
+    }
+
+# One GenerativeModel per model name, shared by every call in this process
+_MODEL_CACHE = {}
+
+def _get_model(model_name):
+    """Returns the shared GenerativeModel for model_name, configuring the SDK on first use"""
+    model = _MODEL_CACHE.get(model_name)
+    if model is None:
+        # Only pay for the SDK import (grpc, protobuf, auth) once we really call the API
+        import google.generativeai as genai
+        if not _MODEL_CACHE:
+            genai.configure(api_key=API_KEY)
+        model = _MODEL_CACHE[model_name] = genai.GenerativeModel(model_name)
+    return model
+
+def _open_stream(model_name, prompt):
+    """Start a streamed generation; returns once the model has sent its first chunk"""
+    response = _get_model(model_name).generate_content(prompt, stream=True)
+    return model_name, response
+
+def _discard(future):
+    """Done-callback for attempts that lost the race: close the unused stream without reading it"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    _, response = future.result()
+    # The SDK response has no public close(); cancel the underlying gRPC stream when it's exposed,
+    # otherwise the reference is simply dropped
+    close = getattr(response, 'close', None) or getattr(getattr(response, '_iterator', None), 'cancel', None)
+    if close:
+        try:
+            close()
+        except Exception:
+            pass
+
+def _race_models(prompt, stream_to=None, echo=True):
+    """
+    Asks the models in MODELS_TO_TRY order, each on its own thread, and streams
+    the first one to answer. The next model is only started when one fails or
+    nothing has answered within MODEL_HEDGE_DELAY seconds, so a healthy first
+    model costs a single request. Attempts that lose are cancelled or closed unread.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(MODELS_TO_TRY))
+    remaining = list(MODELS_TO_TRY)
+    names = {}
+    pending = set()
+    winner = None
+    first_error = None
+
+    def launch():
+        model_name = remaining.pop(0)
+        future = executor.submit(_open_stream, model_name, prompt)
+        names[future] = model_name
+        pending.add(future)
+
+    try:
+        launch()
+        while pending and winner is None:
+            hedge = remaining and MODEL_HEDGE_DELAY > 0
+            done, _ = wait(pending, timeout=MODEL_HEDGE_DELAY if hedge else None,
+                           return_when=FIRST_COMPLETED)
+            pending.difference_update(done)
+            if not done:
+                # Nobody has answered yet: hedge with the next model
+                launch()
+                continue
+            for future in done:
+                if future.exception() is None:
+                    if winner is None:
+                        winner = future.result()
+                    else:
+                        _discard(future)
+                    continue
+                model_name = names[future]
+                error_msg = str(future.exception())
+                if "429" in error_msg or "quota" in error_msg.lower():
+                    print(f"⚠️  Quota exceeded for {model_name}, trying next model...")
+                elif "404" in error_msg or "not found" in error_msg.lower():
+                    print(f"⚠️  Model {model_name} not available, trying next model...")
+                elif first_error is None:
+                    first_error = (model_name, error_msg)
+                if winner is None and remaining:
+                    launch()
+    finally:
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(_discard)
+        executor.shutdown(wait=False)
+
+    if winner is None:
+        if first_error:
+            return f"Error communicating with AI ({first_error[0]}): {first_error[1]}"
+        return "❌ All Gemini models exceeded quota or unavailable. Please try again later or wait for quota reset."
+
+    model_name, response = winner
+    if echo:
+        print(f"✅ Using model: {model_name}")
+    chunks = []
+    try:
+        for chunk in response:
+            chunks.append(chunk.text)
+            _emit(chunk.text, stream_to, echo)
+    except Exception as e:
+        return f"Error communicating with AI ({model_name}): {str(e)}"
+    if echo:
+        print()
+    text = "".join(chunks)
+    _write_cache(model_name, prompt, text)
+    return text
+
+def get_clinical_insight(json_data, stream_to=None, echo=True):
     """
     Sends the raw JSON data to Gemini with the ClinicalInsightAgent persona.
     Tries multiple models if quota is exceeded.
+    Fallback models are tried (and hedged on slow answers) by _race_models and
+    the winner is streamed: chunks are echoed (and written to `stream_to`) as they arrive.
+    Pass echo=False to only write to `stream_to` (e.g. when several reports run at once).
     """
-    genai.configure(api_key=API_KEY)
-    
-    # Try each model in sequence
-    for model_name in MODELS_TO_TRY:
-        try:
-            print(f"🔄 Trying model: {model_name}")
-            model = genai.GenerativeModel(model_name)
-
-            # The System Prompt: Defines the AI's persona and logic
-            # REFINED FOR SIMPLICITY AND HUMAN-FRIENDLINESS
-            prompt = f"""
-        You are 'ClinicalInsightAgent', a warm, friendly, and clear AI health assistant. 
-        Think of yourself as a kind doctor explaining results to a patient who has ZERO medical background.
-
-        GOAL:
-        Translate the provided Medical Lab Report (JSON) into a simple story about the patient's health.
-        **AVOID COMPLEX JARGON.** If you must use a medical term, explain it immediately with a simple real-world analogy.
-
-        INPUT DATA:
-        {json.dumps(json_data, indent=2)}
-
-        OUTPUT GUIDELINES (Use Basic English):
-
-        1.  **The "Big Picture" (Executive Summary)**:
-            -   Start with a friendly greeting.
-            -   Give a 3-sentence summary. Is the engine running smoothly? Or does it need a tune-up?
-            -   Use clear phrases like "Overall, you are in great shape!" or "There are a few things we need to watch."
-
-        2.  **What the Results Mean (Detailed Analysis)**:
-            -   Don't just list numbers. Group them logically (e.g., "Blood Health," "Liver Health," "Energy Levels").
-            -   For each key result:
-                -   **What is it?** Use an analogy! (e.g., "Hemoglobin is like a delivery truck for oxygen.")
-                -   **Your Status:** Use simple terms: "Normal," "A bit low," "A bit high."
-                -   **Why it matters:** Explain the feeling or risk (e.g., "Low levels might make you feel tired.").
-            -   Use Emojis visually: ✅ (Good), ⚠️ (Caution), 🚨 (Needs Attention).
-
-        3.  **Connecting the Dots (Correlations)**:
-            -   Explain if one result is affecting another.
-            -   Example: "Since your hydration is low, that might be why your concentration levels are off."
-
-        4.  **Simple Next Steps (Actionable Recommendations)**:
-            -   Give 3 very specific, easy things to do *tomorrow*.
-            -   Bad: "Improve diet."
-            -   Good: "Try adding a handful of spinach to your lunch" or "Drink one extra glass of water before breakfast."
-
-        5.  **Important Note (Disclaimer)**:
-            -   Remind them gently that you are an AI helper, not a replacement for their real doctor.
-
-        FORMAT:
-        -   Use short paragraphs.
-        -   Use bullet points.
-        -   Keep the tone conversational and encouraging.
-        """
-
-            response = model.generate_content(prompt)
-            print(f"✅ Successfully used model: {model_name}")
-            return response.text
-        
-        except Exception as e:
-            error_msg = str(e)
-            # Check if it's a quota error
-            if "429" in error_msg or "quota" in error_msg.lower():
-                print(f"⚠️  Quota exceeded for {model_name}, trying next model...")
-                continue  # Try next model
-            elif "404" in error_msg or "not found" in error_msg.lower():
-                print(f"⚠️  Model {model_name} not available, trying next...")
-                continue  # Try next model
-            else:
-                # Other error, return it
-                return f"Error communicating with AI ({model_name}): {str(e)}"
-    
-    # If all models failed
-    return "❌ All Gemini models exceeded quota or unavailable. Please try again later or wait for quota reset."
+    # The System Prompt: Defines the AI's persona and logic
+    # REFINED FOR SIMPLICITY AND HUMAN-FRIENDLINESS
+    prompt = f"""
+    You are 'ClinicalInsightAgent', a warm, friendly, and clear AI health assistant. 
+    Think of yourself as a kind doctor explaining results to a patient who has ZERO medical background.
 
-def main(file_path=None):
+    GOAL:
+    Translate the provided Medical Lab Report (JSON) into a simple story about the patient's health.
+    **AVOID COMPLEX JARGON.** If you must use a medical term, explain it immediately with a simple real-world analogy.
+
+    INPUT DATA:
+    {_dumps_pretty(json_data)}
+
+    OUTPUT GUIDELINES (Use Basic English):
+
+    1.  **The "Big Picture" (Executive Summary)**:
+        -   Start with a friendly greeting.
+        -   Give a 3-sentence summary. Is the engine running smoothly? Or does it need a tune-up?
+        -   Use clear phrases like "Overall, you are in great shape!" or "There are a few things we need to watch."
+
+    2.  **What the Results Mean (Detailed Analysis)**:
+        -   Don't just list numbers. Group them logically (e.g., "Blood Health," "Liver Health," "Energy Levels").
+        -   For each key result:
+            -   **What is it?** Use an analogy! (e.g., "Hemoglobin is like a delivery truck for oxygen.")
+            -   **Your Status:** Use simple terms: "Normal," "A bit low," "A bit high."
+            -   **Why it matters:** Explain the feeling or risk (e.g., "Low levels might make you feel tired.").
+        -   Use Emojis visually: ✅ (Good), ⚠️ (Caution), 🚨 (Needs Attention).
+
+    3.  **Connecting the Dots (Correlations)**:
+        -   Explain if one result is affecting another.
+        -   Example: "Since your hydration is low, that might be why your concentration levels are off."
+
+    4.  **Simple Next Steps (Actionable Recommendations)**:
+        -   Give 3 very specific, easy things to do *tomorrow*.
+        -   Bad: "Improve diet."
+        -   Good: "Try adding a handful of spinach to your lunch" or "Drink one extra glass of water before breakfast."
+
+    5.  **Important Note (Disclaimer)**:
+        -   Remind them gently that you are an AI helper, not a replacement for their real doctor.
+
+    FORMAT:
+    -   Use short paragraphs.
+    -   Use bullet points.
+    -   Keep the tone conversational and encouraging.
+    """
+
+    # Identical prompt already answered? Replay it instead of calling the API
+    cached = _read_cache(prompt)
+    if cached:
+        model_name, text = cached
+        if echo:
+            print(f"♻️  Using cached response from {model_name}")
+        _emit(text, stream_to, echo)
+        if echo:
+            print()
+        return text
+
+    # Try the fallback models in order; the first to start answering wins
+    return _race_models(prompt, stream_to, echo)
+
+def main(file_path=None, data=None, echo=True):
     """
     Main function to run the Clinical Insight Agent.
+    Pass `data` (the already-parsed report) to skip re-reading `file_path`;
+    the path is then only used to name the output.
+    With echo=False the streamed response and progress banners aren't printed
+    (for callers running several agents side by side); errors still are.
     Returns the output file path if successful, None otherwise.
     """
     # 1. Check if the user provided a file path
@@ -114,62 +302,69 @@ def main(file_path=None):
             return None
         file_path = sys.argv[1]
 
-    # 2. Check if file exists
-    if not os.path.exists(file_path):
-        print(f"\n❌ Error: File not found at '{file_path}'")
-        return None
-
-    # 3. Read and Parse JSON
-    print(f"\n📂 Reading file: {file_path}...")
-    try:
-        with open(file_path, 'r') as f:
-            lab_data = json.load(f)
-    except json.JSONDecodeError:
-        print("❌ Error: The file is not valid JSON.")
-        return None
-    except Exception as e:
-        print(f"❌ Error reading file: {e}")
-        return None
+    # 2-3. Read and parse the JSON, unless the caller already did
+    if data is not None:
+        lab_data = data
+    else:
+        # 2. Check if file exists
+        if not os.path.exists(file_path):
+            print(f"\n❌ Error: File not found at '{file_path}'")
+            return None
 
-    # 4. Generate Analysis
-    print("🧠 ClinicalInsightAgent is analyzing the data... (Please wait)")
-    analysis = get_clinical_insight(lab_data)
-    
-    if not analysis or analysis.startswith("❌") or analysis.startswith("Error"):
-        print("❌ Failed to generate clinical analysis")
-        if analysis:
-            print(analysis)
-        return None
+        # 3. Read and Parse JSON
+        if echo:
+            print(f"\n📂 Reading file: {file_path}...")
+        try:
+            with (gzip.open if file_path.endswith('.gz') else open)(file_path, 'rb') as f:
+                lab_data = _loads(f.read())
+        except json.JSONDecodeError:
+            print("❌ Error: The file is not valid JSON.")
+            return None
+        except Exception as e:
+            print(f"❌ Error reading file: {e}")
+            return None
 
-    # 5. Save to file
+    # 4. Prepare output file
     # Create output folder if it doesn't exist
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
     
     # Generate filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    input_filename = os.path.splitext(os.path.basename(file_path))[0]
+    input_filename = os.path.splitext(os.path.basename(file_path).removesuffix('.gz'))[0]
     output_filename = f"{input_filename}_summary_{timestamp}.txt"
     output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-    
-    # Write analysis to file
-    with open(output_path, 'w', encoding='utf-8') as f:
+    if COMPRESS_OUTPUT:
+        output_path += '.gz'
+
+    # 5. Generate Analysis, streaming it into the file as it arrives
+    if echo:
+        print("🧠 ClinicalInsightAgent is analyzing the data... (Please wait)")
+        print("\n" + "="*50)
+        print("REPORT ANALYSIS")
+        print("="*50 + "\n")
+    with _open_output(output_path) as f:
         f.write("="*70 + "\n")
         f.write("CLINICAL INSIGHT AGENT - LAB REPORT ANALYSIS\n")
         f.write("="*70 + "\n\n")
         f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write(f"Source File: {file_path}\n")
         f.write("="*70 + "\n\n")
-        f.write(analysis)
+        f.flush()
+        analysis = get_clinical_insight(_slim_lab_data(lab_data), stream_to=f, echo=echo)
         f.write("\n\n" + "="*70 + "\n")
+    
+    if not analysis or analysis.startswith("❌") or analysis.startswith("Error"):
+        os.remove(output_path)
+        print("❌ Failed to generate clinical analysis")
+        if analysis:
+            print(analysis)
+        return None
 
     # 6. Output Result
-    print("\n" + "="*50)
-    print("REPORT ANALYSIS")
-    print("="*50 + "\n")
-    print(analysis)
-    print("\n" + "="*50)
-    print(f"\n✅ Summary saved to: {output_path}")
-    print(f"📁 Output folder: {os.path.abspath(OUTPUT_FOLDER)}\n")
+    if echo:
+        print("\n" + "="*50)
+        print(f"\n✅ Summary saved to: {output_path}")
+        print(f"📁 Output folder: {os.path.abspath(OUTPUT_FOLDER)}\n")
     
     return output_path
 
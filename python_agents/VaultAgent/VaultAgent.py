@@ -6,12 +6,17 @@ Uses AI for intelligent name matching and deduplication
 
 import os
 import sys
+import re
 import json
 import shutil
-from pathlib import Path
+import filecmp
+import tempfile
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
 from difflib import SequenceMatcher
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
 # Add paths for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ExtractionAgent'))
@@ -19,6 +24,30 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ExtractionAgen
 from pdf_extraction import AdvancedPDFExtractor
 from data_structuring import CSVToStructuredJSON
 
+try:
+    from rapidfuzz import fuzz, process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import jellyfish
+    JELLYFISH_AVAILABLE = True
+except ImportError:
+    JELLYFISH_AVAILABLE = False
+
+try:
+    from cachetools import TTLCache
+    CACHETOOLS_AVAILABLE = True
+except ImportError:
+    CACHETOOLS_AVAILABLE = False
+
 # Import AI capabilities
 try:
     from google import genai
@@ -38,10 +67,155 @@ class Config:
         'gemini-2.5-flash-lite'
     ]
     SIMILARITY_THRESHOLD = 0.85  # 85% similarity for name matching
+    AI_LOW = 0.60  # rule-based similarity below this: not a match, AI not asked
+    AI_HIGH = 0.95  # at or above this: accepted without asking the AI
+    PARALLEL_MATCH_MIN = 5000  # fuzzy-scored candidates at which rapidfuzz spreads work over all cores
+    AI_CACHE_SIZE = 4096  # cached name-pair verdicts
+    AI_CACHE_TTL = 600  # seconds (needs cachetools; otherwise kept until the cache fills)
     VAULT_BASE_DIR = "PatientVaults"
+    VAULTS_INDEX_FILE = "vaults_index.json"  # patient_id -> full metadata, read instead of every vault at startup
+    HARDLINK_REPORTS = True  # hardlink PDFs into vaults when on the same filesystem; False always copies
     DEBUG = False
 
 
+def _dumps(obj) -> bytes:
+    """Indented JSON bytes for metadata/index files, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2).encode('utf-8')
+
+
+def _loads(raw):
+    """Parse JSON bytes, using orjson when it is installed"""
+    return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+
+
+# Titles/prefixes dropped from names before comparison
+_TITLES = frozenset({'dr', 'mr', 'mrs', 'ms', 'prof'})
+# Anything that is not a letter, digit or whitespace (same set as str.isalnum/isspace)
+_NON_ALNUM_RE = re.compile(r'[^\w\s]|_')
+# AI name-matching prompts; only the names are filled in per call
+_AI_CONSIDER = """Consider:
+- Name order variations (John Smith vs Smith, John)
+- Middle initials or names
+- Titles (Dr., Mr., Mrs.)
+- Spelling variations
+- Case differences"""
+
+_AI_PROMPT = """You are a medical records expert. Determine if these two patient names refer to the SAME person:
+
+Name 1: "%s"
+Name 2: "%s"
+
+""" + _AI_CONSIDER + """
+
+Respond in this EXACT JSON format:
+{
+    "is_match": true/false,
+    "confidence": 0.0-1.0,
+    "explanation": "brief reason"
+}"""
+
+_AI_BATCH_PROMPT = """You are a medical records expert. Determine which of the candidate patient names refer to the SAME person as the new patient:
+
+New patient: "%s"
+
+Candidates:
+%s
+
+""" + _AI_CONSIDER + """
+
+Respond with ONE entry per candidate in this EXACT JSON array format:
+[
+    {"i": 0, "match": true/false, "conf": 0.0-1.0, "why": "brief reason"}
+]"""
+
+# JSON object / array embedded in an AI response
+_JSON_RE = re.compile(r'\{.*\}', re.DOTALL)
+_JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+
+
+@lru_cache(maxsize=8192)
+def normalize_name(name: str) -> str:
+    """Normalize name for comparison (memoized: the same names recur across every match)"""
+    if not name:
+        return ""
+    
+    # Convert to lowercase, remove extra spaces
+    name = name.lower().strip()
+    
+    # Remove titles and prefixes
+    words = name.split()
+    filtered_words = [w for w in words if w.rstrip('.') not in _TITLES]
+    
+    # Remove special characters
+    name = ' '.join(filtered_words)
+    name = _NON_ALNUM_RE.sub('', name)
+    
+    return ' '.join(name.split())  # Remove extra spaces
+
+
+@lru_cache(maxsize=8192)
+def extract_core_name(name: str) -> str:
+    """Extract first and last name only"""
+    normalized = normalize_name(name)
+    
+    # Handle "LastName, FirstName" format
+    if ',' in normalized:
+        parts = normalized.split(',')
+        if len(parts) == 2:
+            # Reverse order: "smith, john" -> "john smith"
+            last_name = parts[0].strip()
+            first_name = parts[1].strip()
+            normalized = f"{first_name} {last_name}"
+    
+    words = normalized.split()
+    
+    if len(words) == 0:
+        return ""
+    elif len(words) == 1:
+        return words[0]
+    elif len(words) == 2:
+        return normalized
+    else:
+        # Take first and last word (common pattern)
+        return f"{words[0]} {words[-1]}"
+
+
+@lru_cache(maxsize=8192)
+def name_features(name: str) -> Tuple[str, str, frozenset]:
+    """(normalized name, core name, frozenset of words): everything calculate_similarity compares"""
+    norm = normalize_name(name)
+    return norm, extract_core_name(name), frozenset(norm.split())
+
+
+@lru_cache(maxsize=8192)
+def core_metaphone(core: str) -> Optional[Tuple[str, str]]:
+    """
+    Metaphone codes of a core name's first and last word, or None when
+    jellyfish is missing or a word has no code (e.g. digits only)
+    """
+    if not JELLYFISH_AVAILABLE or not core:
+        return None
+    words = core.split()
+    codes = (jellyfish.metaphone(words[0]), jellyfish.metaphone(words[-1]))
+    return codes if all(codes) else None
+
+
+def name_block_keys(name: str) -> frozenset:
+    """
+    Blocking keys for a name: the Soundex code (first letter without jellyfish)
+    of its first and last word. Names that share no key are never compared.
+    """
+    words = normalize_name(name).split()
+    if not words:
+        return frozenset()
+    ends = {words[0], words[-1]}
+    if JELLYFISH_AVAILABLE:
+        return frozenset(jellyfish.soundex(w) for w in ends)
+    return frozenset(w[0] for w in ends)
+
+
 class PatientIdentifier:
     """
     AI-powered patient identification and name matching
@@ -54,6 +228,11 @@ class PatientIdentifier:
     def __init__(self):
         """Initialize the AI client if available"""
         self.client = None
+        # (normalized name, normalized name) -> (is_match, confidence, explanation), AI verdicts only
+        if CACHETOOLS_AVAILABLE:
+            self._ai_cache = TTLCache(maxsize=Config.AI_CACHE_SIZE, ttl=Config.AI_CACHE_TTL)
+        else:
+            self._ai_cache = OrderedDict()
         if AI_AVAILABLE and Config.API_KEY:
             try:
                 self.client = genai.Client(api_key=Config.API_KEY)
@@ -62,80 +241,62 @@ class PatientIdentifier:
     
     def normalize_name(self, name: str) -> str:
         """Normalize name for comparison"""
-        if not name:
-            return ""
-        
-        # Convert to lowercase, remove extra spaces
-        name = name.lower().strip()
-        
-        # Remove titles and prefixes
-        titles = ['dr', 'dr.', 'mr', 'mr.', 'mrs', 'mrs.', 'ms', 'ms.', 'prof', 'prof.']
-        words = name.split()
-        filtered_words = [w for w in words if w.replace('.', '') not in titles]
-        
-        # Remove special characters
-        name = ' '.join(filtered_words)
-        name = ''.join(c for c in name if c.isalnum() or c.isspace())
-        
-        return ' '.join(name.split())  # Remove extra spaces
+        return normalize_name(name)
     
     def extract_core_name(self, name: str) -> str:
         """Extract first and last name only"""
-        normalized = self.normalize_name(name)
-        
-        # Handle "LastName, FirstName" format
-        if ',' in normalized:
-            parts = normalized.split(',')
-            if len(parts) == 2:
-                # Reverse order: "smith, john" -> "john smith"
-                last_name = parts[0].strip()
-                first_name = parts[1].strip()
-                normalized = f"{first_name} {last_name}"
-        
-        words = normalized.split()
-        
-        if len(words) == 0:
-            return ""
-        elif len(words) == 1:
-            return words[0]
-        elif len(words) == 2:
-            return normalized
-        else:
-            # Take first and last word (common pattern)
-            return f"{words[0]} {words[-1]}"
+        return extract_core_name(name)
     
     def calculate_similarity(self, name1: str, name2: str) -> float:
         """Calculate similarity score between two names"""
-        norm1 = self.normalize_name(name1)
-        norm2 = self.normalize_name(name2)
+        return self.calculate_similarity_pre(name_features(name1), name_features(name2))
+    
+    def calculate_similarity_pre(self, target: Tuple[str, str, frozenset],
+                                 candidate: Tuple[str, str, frozenset]) -> float:
+        """calculate_similarity on precomputed name_features() tuples"""
+        norm1, core1, words1 = target
+        norm2, core2, words2 = candidate
         
         # Direct match
         if norm1 == norm2:
             return 1.0
         
-        # Extract core names (handles "LastName, FirstName" format)
-        core1 = self.extract_core_name(name1)
-        core2 = self.extract_core_name(name2)
-        
+        # Core names (handles "LastName, FirstName" format)
         if core1 == core2 and core1:
             return 0.95
         
-        # Check if names are reversed (word order)
-        words1 = set(norm1.split())
-        words2 = set(norm2.split())
+        # Same-sounding core names ("Catherine" / "Katherine")
+        phonetic1 = core_metaphone(core1)
+        if phonetic1 and phonetic1 == core_metaphone(core2):
+            return 0.92
         
         # If same words, just different order
         if words1 == words2 and len(words1) > 0:
             return 0.90
         
-        # Use sequence matcher
-        ratio = SequenceMatcher(None, norm1, norm2).ratio()
+        # Use sequence matcher (rapidfuzz's C++ Indel ratio when installed)
+        if RAPIDFUZZ_AVAILABLE:
+            ratio = fuzz.ratio(norm1, norm2) / 100.0
+        else:
+            ratio = SequenceMatcher(None, norm1, norm2).ratio()
         
         return ratio
     
+    def _ai_cache_key(self, name1: str, name2: str) -> Tuple[str, str]:
+        """Order-independent cache key, so (A, B) and (B, A) share an entry"""
+        return tuple(sorted((self.normalize_name(name1), self.normalize_name(name2))))
+    
+    def _cache_ai_result(self, key: Tuple[str, str], result: Tuple[bool, float, str]):
+        """Store an AI verdict; without cachetools the oldest entry is evicted once the cache is full"""
+        self._ai_cache[key] = result
+        if not CACHETOOLS_AVAILABLE and len(self._ai_cache) > Config.AI_CACHE_SIZE:
+            self._ai_cache.popitem(last=False)
+    
     def use_ai_matching(self, name1: str, name2: str) -> Tuple[bool, float, str]:
         """
         Use AI to determine if two names refer to the same person
+        AI verdicts are cached per normalized name pair; rule-based fallbacks are not,
+        so a transient AI failure doesn't pin the pair to the fallback verdict
         Returns: (is_match, confidence, explanation)
         """
         if not self.client:
@@ -144,25 +305,27 @@ class PatientIdentifier:
             is_match = similarity >= Config.SIMILARITY_THRESHOLD
             return is_match, similarity, "Rule-based matching"
         
+        key = self._ai_cache_key(name1, name2)
+        cached = self._ai_cache.get(key)
+        if cached is not None:
+            if Config.DEBUG:
+                print(f"AI matching cache hit: {key}")
+            return cached
+        
+        result = self._ask_ai_matching(name1, name2)
+        if result is not None:
+            self._cache_ai_result(key, result)
+            return result
+        
+        # Fallback to rule-based
+        similarity = self.calculate_similarity(name1, name2)
+        is_match = similarity >= Config.SIMILARITY_THRESHOLD
+        return is_match, similarity, "Fallback matching"
+    
+    def _ask_ai_matching(self, name1: str, name2: str) -> Optional[Tuple[bool, float, str]]:
+        """The AI's verdict for use_ai_matching, or None if the request or its parsing fails"""
         try:
-            prompt = f"""You are a medical records expert. Determine if these two patient names refer to the SAME person:
-
-Name 1: "{name1}"
-Name 2: "{name2}"
-
-Consider:
-- Name order variations (John Smith vs Smith, John)
-- Middle initials or names
-- Titles (Dr., Mr., Mrs.)
-- Spelling variations
-- Case differences
-
-Respond in this EXACT JSON format:
-{{
-    "is_match": true/false,
-    "confidence": 0.0-1.0,
-    "explanation": "brief reason"
-}}"""
+            prompt = _AI_PROMPT % (name1, name2)
 
             response = self.client.models.generate_content(
                 model=Config.MODELS[0],
@@ -173,8 +336,7 @@ Respond in this EXACT JSON format:
             response_text = response.text.strip()
             
             # Extract JSON from response
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+            json_match = _JSON_RE.search(response_text)
             if json_match:
                 result = json.loads(json_match.group())
                 return (
@@ -187,10 +349,119 @@ Respond in this EXACT JSON format:
             if Config.DEBUG:
                 print(f"AI matching failed: {e}")
         
-        # Fallback to rule-based
-        similarity = self.calculate_similarity(name1, name2)
-        is_match = similarity >= Config.SIMILARITY_THRESHOLD
-        return is_match, similarity, "Fallback matching"
+        return None
+    
+    def use_ai_matching_batch(self, new_name: str,
+                              existing_names: List[str]) -> Optional[List[Tuple[bool, float, str]]]:
+        """
+        Use AI to compare one name against all existing names in a single request
+        Returns: list of (is_match, confidence, explanation) aligned with existing_names,
+        or None if AI is unavailable or the response can't be parsed
+        """
+        if not self.client or not existing_names:
+            return None
+        
+        # Only ask the AI about pairs it hasn't already judged
+        keys = [self._ai_cache_key(new_name, name) for name in existing_names]
+        results = [self._ai_cache.get(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if Config.DEBUG and len(pending) < len(keys):
+            print(f"AI matching cache hits: {len(keys) - len(pending)}/{len(keys)}")
+        if not pending:
+            return results
+        
+        try:
+            candidates = "\n".join(f'{j}. "{existing_names[i]}"' for j, i in enumerate(pending))
+            prompt = _AI_BATCH_PROMPT % (new_name, candidates)
+
+            response = self.client.models.generate_content(
+                model=Config.MODELS[0],
+                contents=prompt
+            )
+            
+            # Parse AI response
+            response_text = response.text.strip()
+            
+            # Extract JSON array from response
+            json_match = _JSON_ARRAY_RE.search(response_text)
+            if json_match:
+                for item in json.loads(json_match.group()):
+                    j = int(item.get('i', -1))
+                    if 0 <= j < len(pending):
+                        i = pending[j]
+                        results[i] = (
+                            bool(item.get('match', False)),
+                            float(item.get('conf', 0.0)),
+                            item.get('why', 'AI analysis')
+                        )
+                        self._cache_ai_result(keys[i], results[i])
+                # Candidates the AI skipped count as non-matches (and aren't cached)
+                return [result or (False, 0.0, "Not assessed by AI") for result in results]
+            
+        except Exception as e:
+            if Config.DEBUG:
+                print(f"AI batch matching failed: {e}")
+        
+        return None
+    
+    def _rule_based_scores(self, new_name: str, candidates: List[Tuple[str, str, frozenset]],
+                           score_cutoff: float = 0.0) -> List[float]:
+        """
+        calculate_similarity of new_name against every candidate's name_features()
+        Scores below score_cutoff come back as 0.0
+        """
+        target = name_features(new_name)
+        
+        if not RAPIDFUZZ_AVAILABLE:
+            scores = [self.calculate_similarity_pre(target, candidate) for candidate in candidates]
+            return [score if score >= score_cutoff else 0.0 for score in scores]
+        
+        norm_new, core_new, words_new = target
+        phonetic_new = core_metaphone(core_new)
+        
+        # Exact / core-name / same-words checks are cheap; collect the rest for fuzzy scoring
+        scores = [0.0] * len(candidates)
+        fuzzy_indices, fuzzy_norms = [], []
+        for i, (norm, core, words) in enumerate(candidates):
+            if norm == norm_new:
+                scores[i] = 1.0
+            elif core_new and core == core_new:
+                scores[i] = 0.95
+            elif phonetic_new and core_metaphone(core) == phonetic_new:
+                scores[i] = 0.92
+            elif words_new and words == words_new:
+                scores[i] = 0.90
+            else:
+                fuzzy_indices.append(i)
+                fuzzy_norms.append(norm)
+        
+        # One native rapidfuzz pass over all remaining names (multi-threaded for large vaults)
+        if len(fuzzy_norms) >= Config.PARALLEL_MATCH_MIN:
+            row = process.cdist(
+                [norm_new], fuzzy_norms, scorer=fuzz.ratio, processor=None,
+                score_cutoff=score_cutoff * 100, workers=-1, dtype='float64'
+            )[0]
+            for j, score in enumerate(row.tolist()):
+                if score:
+                    scores[fuzzy_indices[j]] = score / 100.0
+        elif fuzzy_norms:
+            matches = process.extract(
+                norm_new, fuzzy_norms, scorer=fuzz.ratio, processor=None,
+                limit=None, score_cutoff=score_cutoff * 100
+            )
+            for _, score, j in matches:
+                scores[fuzzy_indices[j]] = score / 100.0
+        
+        return [score if score >= score_cutoff else 0.0 for score in scores]
+    
+    @staticmethod
+    def _best_score(scores: List[float], threshold: float) -> Tuple[Optional[int], float]:
+        """Index and value of the highest score >= threshold (earliest on ties), or (None, 0.0)"""
+        best_index, best_score = None, 0.0
+        for i, score in enumerate(scores):
+            if score >= threshold and score > best_score:
+                best_index, best_score = i, score
+        return best_index, best_score
     
     def find_matching_patient(self, 
                             new_name: str, 
@@ -199,27 +470,48 @@ Respond in this EXACT JSON format:
         Find if the new patient matches any existing patient
         Returns matching patient info or None
         """
-        best_match = None
-        best_score = 0.0
+        existing_names = [patient.get('canonical_name', '') for patient in existing_patients]
+        candidates = [name_features(name) for name in existing_names]
+        best_index = self.find_matching_index(new_name, existing_names, candidates)
+        return existing_patients[best_index] if best_index is not None else None
+    
+    def find_matching_index(self, new_name: str, existing_names: List[str],
+                            candidates: List[Tuple[str, str, frozenset]]) -> Optional[int]:
+        """
+        find_matching_patient over parallel lists: candidate names and their
+        name_features(). Returns the index of the match or None
         
-        for patient in existing_patients:
-            existing_name = patient.get('canonical_name', '')
+        With AI available, local similarity decides the clear cases: a score
+        >= AI_HIGH is accepted outright, below AI_LOW is rejected, and only the
+        candidates in between are sent to the AI (in one batched call).
+        """
+        use_ai = bool(Config.API_KEY and AI_AVAILABLE)
+        
+        if not use_ai:
+            scores = self._rule_based_scores(new_name, candidates, Config.SIMILARITY_THRESHOLD)
+            best_index, best_score = self._best_score(scores, Config.SIMILARITY_THRESHOLD)
+        else:
+            scores = self._rule_based_scores(new_name, candidates, Config.AI_LOW)
+            best_index, best_score = self._best_score(scores, Config.AI_HIGH)
+            ambiguous = [i for i, score in enumerate(scores) if Config.AI_LOW <= score < Config.AI_HIGH]
             
-            if Config.API_KEY and AI_AVAILABLE:
-                is_match, confidence, explanation = self.use_ai_matching(
-                    new_name, existing_name
+            if best_index is None and ambiguous:
+                ai_results = self.use_ai_matching_batch(
+                    new_name, [existing_names[i] for i in ambiguous]
                 )
-                if is_match and confidence > best_score:
-                    best_match = patient
-                    best_score = confidence
-            else:
-                similarity = self.calculate_similarity(new_name, existing_name)
-                if similarity >= Config.SIMILARITY_THRESHOLD and similarity > best_score:
-                    best_match = patient
-                    best_score = similarity
+                if ai_results is None:
+                    # AI unreachable: rule-based verdict on the same candidates
+                    best_index, best_score = self._best_score(scores, Config.SIMILARITY_THRESHOLD)
+                else:
+                    for i, (is_match, confidence, explanation) in zip(ambiguous, ai_results):
+                        if is_match and confidence > best_score:
+                            best_index, best_score = i, confidence
+        
+        if Config.DEBUG:
+            print(f"normalize_name cache: {normalize_name.cache_info()}")
         
-        if best_match and best_score >= Config.SIMILARITY_THRESHOLD:
-            return best_match
+        if best_index is not None and best_score >= Config.SIMILARITY_THRESHOLD:
+            return best_index
         
         return None
 
@@ -230,40 +522,141 @@ class PatientVault:
     Stores all reports chronologically
     """
     
-    def __init__(self, vault_dir: str, patient_info: Dict):
-        """Initialize patient vault"""
+    def __init__(self, vault_dir: str, patient_info: Dict, create: bool = True,
+                 report_count: int = None):
+        """
+        Initialize patient vault
+        create=False skips the mkdir for vaults already on disk; it then
+        happens lazily, once, before the first write
+        report_count, when known (e.g. from the vaults index), saves scanning the directory
+        """
         self.vault_dir = vault_dir
         self.patient_info = patient_info
+        self.metadata_file = os.path.join(vault_dir, "patient_metadata.json")
+        # Parsed metadata kept in memory so lookups never go back to disk
+        self.metadata = {k: v for k, v in patient_info.items() if k != 'medical_data'}
+        # Given, or filled by the first get_report_count(); then kept by add_report()
+        self._report_count = report_count
         
         # Create directory
-        os.makedirs(self.vault_dir, exist_ok=True)
+        self._dir_ready = False
+        if create:
+            self._ensure_dir()
     
-
+    def _ensure_dir(self):
+        """Create the vault directory if this instance hasn't yet"""
+        if not self._dir_ready:
+            os.makedirs(self.vault_dir, exist_ok=True)
+            self._dir_ready = True
+    
+    def save_metadata(self):
+        """Write the in-memory metadata to patient_metadata.json"""
+        self._ensure_dir()
+        with open(self.metadata_file, 'wb') as f:
+            f.write(_dumps(self.metadata))
     
     def get_all_reports(self) -> List[str]:
         """Get list of all reports in vault"""
-        if not os.path.exists(self.vault_dir):
+        try:
+            with os.scandir(self.vault_dir) as it:
+                return sorted(e.path for e in it if e.name.endswith('.pdf') and e.is_file())
+        except FileNotFoundError:
             return []
-        
-        reports = []
-        for file in os.listdir(self.vault_dir):
-            if file.endswith('.pdf'):
-                reports.append(os.path.join(self.vault_dir, file))
-        
-        return sorted(reports)
+    
+    def get_report_count(self) -> int:
+        """Number of reports in vault (the directory is only scanned once)"""
+        if self._report_count is None:
+            self._report_count = len(self.get_all_reports())
+        return self._report_count
     
     def add_report(self, pdf_path: str, json_data: Dict = None) -> str:
         """
         Add a new report to the vault
         Returns the PDF path
         """
-        # Copy PDF directly to patient folder
-        pdf_dest = os.path.join(self.vault_dir, os.path.basename(pdf_path))
-        shutil.copy2(pdf_path, pdf_dest)
+        # Link (or copy) PDF directly to patient folder
+        self._ensure_dir()
+        pdf_name = os.path.basename(pdf_path)
+        stem, ext = os.path.splitext(pdf_name)
+        pdf_dest = os.path.join(self.vault_dir, pdf_name)
+        counter = 1
+        while os.path.exists(pdf_dest):
+            # Already in the vault (linked earlier, or a byte-identical copy): nothing to add
+            if os.path.samefile(pdf_path, pdf_dest) or filecmp.cmp(pdf_path, pdf_dest, shallow=False):
+                return pdf_dest
+            # A different report with the same name is kept alongside it, never overwritten
+            pdf_dest = os.path.join(self.vault_dir, f"{stem}_{counter}{ext}")
+            counter += 1
+        
+        linked = False
+        if Config.HARDLINK_REPORTS:
+            try:
+                os.link(pdf_path, pdf_dest)
+                linked = True
+            except OSError:
+                pass  # other filesystem or no link support: copy instead
+        
+        if not linked:
+            # Copy to a fresh temp file and rename it into place, so an existing
+            # (possibly hardlinked) file is replaced, never written through.
+            # copyfile uses sendfile on Linux; file metadata isn't needed for reports
+            fd, tmp_path = tempfile.mkstemp(dir=self.vault_dir, suffix='.tmp')
+            os.close(fd)
+            try:
+                shutil.copyfile(pdf_path, tmp_path)
+                os.replace(tmp_path, pdf_dest)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        
+        if self._report_count is not None:
+            self._report_count += 1
         
         return pdf_dest
 
 
+def _extract_patient_info(pdf_path: str) -> Dict:
+    """
+    Extract patient information from PDF
+    Runs entirely in memory (no temp CSVs) and touches no manager state,
+    so batches can run it in worker processes
+    Returns patient info dictionary
+    """
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+    
+    print(f"\n📄 Extracting patient info from PDF...")
+    
+    try:
+        # Extract PDF tables/text and structure them without a CSV round trip
+        extractor = AdvancedPDFExtractor(pdf_path)
+        converter = CSVToStructuredJSON.from_dataframes(extractor.extract_to_dataframes())
+        medical_data = converter.create_medical_report_json()
+        
+        # Extract patient information
+        patient_info = medical_data.get('patient', {})
+        demographics = patient_info.get('demographics', {})
+        
+        # Get patient name
+        patient_name = demographics.get('name', 'Unknown Patient')
+        
+        # Prepare patient info
+        result = {
+            'canonical_name': patient_name,
+            'name_variations': [patient_name],
+            'demographics': demographics,
+            'created_at': datetime.now().isoformat(),
+            'medical_data': medical_data
+        }
+        
+        return result
+        
+    except Exception as e:
+        print(f"❌ Error extracting patient info: {e}")
+        raise
+
+
 class SmartVaultManager:
     """
     Main manager for the Smart Patient Vault system
@@ -275,36 +668,147 @@ class SmartVaultManager:
         self.vault_base_dir = vault_base_dir or Config.VAULT_BASE_DIR
         self.identifier = PatientIdentifier()
         self.vaults = {}  # patient_id -> PatientVault
+        self._dirty_vaults = set()  # patient_ids whose metadata the vaults index hasn't got yet
         
         os.makedirs(self.vault_base_dir, exist_ok=True)
         
         # Load existing vaults
         self._load_existing_vaults()
+        self._rebuild_patients_cache()
     
     def _load_existing_vaults(self):
-        """Load all existing patient vaults"""
+        """
+        Load all existing patient vaults
+        Metadata and report counts come from the single vaults index; only vault
+        directories it doesn't list (e.g. created by another process) have their own
+        patient_metadata.json read, and are then added to the index. Vaults indexed
+        without a report count are counted once and the count is added to the index
+        """
         if not os.path.exists(self.vault_base_dir):
             return
         
-        for patient_dir in os.listdir(self.vault_base_dir):
-            vault_path = os.path.join(self.vault_base_dir, patient_dir)
-            if os.path.isdir(vault_path):
+        index_path = os.path.join(self.vault_base_dir, Config.VAULTS_INDEX_FILE)
+        vaults_index = {}
+        try:
+            with open(index_path, 'rb') as f:
+                vaults_index = _loads(f.read())
+            if not isinstance(vaults_index, dict):
+                raise TypeError(f"expected an object, got {type(vaults_index).__name__}")
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError) as e:
+            print(f"⚠️  Rebuilding unreadable {Config.VAULTS_INDEX_FILE}: {e}")
+            vaults_index = {}
+        
+        with os.scandir(self.vault_base_dir) as it:
+            vault_dirs = sorted((e.name, e.path) for e in it if e.is_dir())
+        
+        for patient_id, vault_path in vault_dirs:
+            metadata = vaults_index.get(patient_id)
+            report_count = None
+            if metadata is None:
                 metadata_path = os.path.join(vault_path, "patient_metadata.json")
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
-                        patient_id = patient_dir
-                        self.vaults[patient_id] = PatientVault(vault_path, metadata)
+                if not os.path.exists(metadata_path):
+                    continue
+                with open(metadata_path, 'rb') as f:
+                    metadata = _loads(f.read())
+            else:
+                metadata = dict(metadata)
+                report_count = metadata.pop('report_count', None)
+            if report_count is None:
+                self._dirty_vaults.add(patient_id)
+            self.vaults[patient_id] = PatientVault(vault_path, metadata, create=False,
+                                                   report_count=report_count)
+        
+        if self._dirty_vaults:
+            self.flush_vaults_index()
     
-    def get_existing_patients(self) -> List[Dict]:
-        """Get list of all existing patients"""
-        patients = []
+    def flush_vaults_index(self):
+        """
+        Write the metadata and report count of vaults changed since the last flush to the vaults index
+        The file is re-read and merged rather than overwritten, so vaults added by
+        other processes in the meantime are kept; written to a per-process temp
+        file and renamed into place
+        """
+        if not self._dirty_vaults:
+            return
+        
+        index_path = os.path.join(self.vault_base_dir, Config.VAULTS_INDEX_FILE)
+        vaults_index = {}
+        try:
+            with open(index_path, 'rb') as f:
+                vaults_index = _loads(f.read())
+            if not isinstance(vaults_index, dict):
+                vaults_index = {}
+        except (FileNotFoundError, ValueError):
+            pass
+        for patient_id in self._dirty_vaults:
+            vault = self.vaults[patient_id]
+            vaults_index[patient_id] = dict(vault.metadata, report_count=vault.get_report_count())
+        
+        fd, tmp_path = tempfile.mkstemp(dir=self.vault_base_dir, prefix='.vaults_index_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_dumps(vaults_index))
+            os.replace(tmp_path, index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._dirty_vaults.clear()
+    
+    def _patient_entry(self, patient_id: str, vault: PatientVault) -> Dict:
+        """Build the get_existing_patients() record for one vault"""
+        entry = dict(vault.metadata)
+        entry['patient_id'] = patient_id
+        entry['vault_path'] = vault.vault_dir
+        entry['report_count'] = vault.get_report_count()
+        return entry
+    
+    def _rebuild_patients_cache(self):
+        """
+        Build the patient cache from the loaded vaults (metadata already in memory)
+        Stored as parallel lists, so matching only walks names and their features
+        """
+        self._patient_ids = []
+        self._canonical_names = []
+        self._patient_features = []  # name_features() of each canonical name
+        self._patient_dicts = []  # full get_existing_patients() records
+        self._block_index = {}  # block key -> positions in the lists above
         for patient_id, vault in self.vaults.items():
-            with open(vault.metadata_file, 'r') as f:
-                metadata = json.load(f)
-                metadata['patient_id'] = patient_id
-                patients.append(metadata)
-        return patients
+            self._add_patient(patient_id, vault)
+    
+    def _add_patient(self, patient_id: str, vault: PatientVault) -> Dict:
+        """Append a vault to the patient cache and block index; returns its record"""
+        entry = self._patient_entry(patient_id, vault)
+        name = entry.get('canonical_name', '')
+        position = len(self._patient_ids)
+        self._patient_ids.append(patient_id)
+        self._canonical_names.append(name)
+        self._patient_features.append(name_features(name))
+        self._patient_dicts.append(entry)
+        for key in name_block_keys(name):
+            self._block_index.setdefault(key, []).append(position)
+        return entry
+    
+    def _candidate_positions(self, name: str) -> List[int]:
+        """
+        Cache positions of patients sharing a blocking key with name
+        (see name_block_keys), or of every patient when none do
+        """
+        positions = set()
+        for key in name_block_keys(name):
+            positions.update(self._block_index.get(key, ()))
+        if not positions:
+            return list(range(len(self._patient_ids)))
+        return sorted(positions)
+    
+    def get_existing_patients(self) -> List[Dict]:
+        """
+        Get list of all existing patients
+        Served from memory; process_pdf() keeps it in step with the vaults
+        """
+        return self._patient_dicts
     
     def _generate_patient_id(self, name: str) -> str:
         """Generate a unique patient ID from name"""
@@ -327,64 +831,17 @@ class SmartVaultManager:
         Extract patient information from PDF
         Returns patient info dictionary
         """
-        print(f"\n📄 Extracting patient info from PDF...")
-        
-        # Create temporary directory for extraction
-        temp_dir = os.path.join(self.vault_base_dir, ".temp_extraction")
-        csv_dir = os.path.join(temp_dir, "csv")
-        json_dir = os.path.join(temp_dir, "json")
-        
-        os.makedirs(csv_dir, exist_ok=True)
-        os.makedirs(json_dir, exist_ok=True)
-        
-        try:
-            # Extract PDF to CSV
-            extractor = AdvancedPDFExtractor(pdf_path)
-            csv_files = extractor.extract_to_csv(
-                output_dir=csv_dir,
-                separate_tables=True
-            )
-            
-            # Convert to JSON
-            converter = CSVToStructuredJSON(csv_dir)
-            pdf_name = Path(pdf_path).stem
-            medical_json_path = os.path.join(json_dir, f"{pdf_name}_medical_report.json")
-            medical_data = converter.create_medical_report_json(medical_json_path)
-            
-            # Extract patient information
-            patient_info = medical_data.get('patient', {})
-            demographics = patient_info.get('demographics', {})
-            
-            # Get patient name
-            patient_name = demographics.get('name', 'Unknown Patient')
-            
-            # Prepare patient info
-            result = {
-                'canonical_name': patient_name,
-                'name_variations': [patient_name],
-                'demographics': demographics,
-                'created_at': datetime.now().isoformat(),
-                'medical_data': medical_data
-            }
-            
-            return result
-            
-        except Exception as e:
-            print(f"❌ Error extracting patient info: {e}")
-            raise
-        
-        finally:
-            # Cleanup temp directory
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+        return _extract_patient_info(pdf_path)
     
-    def process_pdf(self, pdf_path: str, patient_hint: str = None) -> Dict:
+    def process_pdf(self, pdf_path: str, patient_hint: str = None, flush: bool = True) -> Dict:
         """
         Main method to process a PDF and assign it to the correct patient vault
         
         Args:
             pdf_path: Path to the PDF file
             patient_hint: Optional hint about patient name (for manual override)
+            flush: Write the vaults index afterwards; batch callers pass False
+                   and call flush_vaults_index() once at the end
         
         Returns:
             Dictionary with processing results
@@ -399,6 +856,16 @@ class SmartVaultManager:
         
         # Extract patient information
         patient_info = self.extract_patient_info(pdf_path)
+        result = self._commit(pdf_path, patient_info, patient_hint)
+        if flush:
+            self.flush_vaults_index()
+        return result
+    
+    def _commit(self, pdf_path: str, patient_info: Dict, patient_hint: str = None) -> Dict:
+        """
+        Assign an extracted PDF to its patient vault (matching, metadata, report copy)
+        Mutates the vaults, so it always runs serially in the main process
+        """
         patient_name = patient_info['canonical_name']
         
         print(f"✅ Extracted patient: {patient_name}")
@@ -409,11 +876,16 @@ class SmartVaultManager:
             patient_info['canonical_name'] = patient_hint
             print(f"   Using hint: {patient_hint}")
         
-        # Find matching patient
-        existing_patients = self.get_existing_patients()
-        matched_patient = self.identifier.find_matching_patient(
-            patient_name, existing_patients
+        # Find matching patient (only among patients in the same name block)
+        positions = self._candidate_positions(patient_name)
+        if Config.DEBUG:
+            print(f"   Comparing against {len(positions)}/{len(self._patient_ids)} patients")
+        match_index = self.identifier.find_matching_index(
+            patient_name,
+            [self._canonical_names[i] for i in positions],
+            [self._patient_features[i] for i in positions]
         )
+        matched_patient = self._patient_dicts[positions[match_index]] if match_index is not None else None
         
         if matched_patient:
             # Existing patient found
@@ -424,14 +896,13 @@ class SmartVaultManager:
             
             # Update name variations
             vault = self.vaults[patient_id]
-            metadata_path = vault.metadata_file
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-            
-            if patient_name not in metadata.get('name_variations', []):
-                metadata['name_variations'].append(patient_name)
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f, indent=2)
+            patient_entry = matched_patient
+            variations = vault.metadata.setdefault('name_variations', [])
+            if patient_name not in variations:
+                variations.append(patient_name)
+                patient_entry['name_variations'] = list(variations)
+                vault.save_metadata()
+                self._dirty_vaults.add(patient_id)
         else:
             # New patient
             patient_id = self._generate_patient_id(patient_name)
@@ -442,13 +913,20 @@ class SmartVaultManager:
             print(f"   Creating vault: {vault_dir}")
             
             vault = PatientVault(vault_dir, patient_info)
+            vault.save_metadata()
             self.vaults[patient_id] = vault
+            self._dirty_vaults.add(patient_id)
+            patient_entry = self._add_patient(patient_id, vault)
         
         # Add report to vault
         print(f"\n💾 Adding report to vault...")
         report_path = vault.add_report(pdf_path, patient_info.get('medical_data'))
         
         print(f"✅ Report saved: {report_path}")
+        total_reports = vault.get_report_count()
+        if total_reports != patient_entry.get('report_count'):
+            patient_entry['report_count'] = total_reports
+            self._dirty_vaults.add(patient_id)
         
         # Summary
         print(f"\n{'='*70}")
@@ -456,42 +934,60 @@ class SmartVaultManager:
         print(f"{'='*70}")
         print(f"Patient: {patient_name}")
         print(f"Vault: {vault.vault_dir}")
-        print(f"Total Reports: {len(vault.get_all_reports())}")
+        print(f"Total Reports: {total_reports}")
         print(f"{'='*70}\n")
         
         return {
             'status': 'success',
             'patient_id': patient_id,
             'patient_name': patient_name,
+            'canonical_name': matched_patient['canonical_name'] if matched_patient else patient_name,
             'vault_dir': vault.vault_dir,
             'report_path': report_path,
             'is_new_patient': matched_patient is None,
-            'total_reports': len(vault.get_all_reports())
+            'total_reports': total_reports
         }
     
-    def process_multiple_pdfs(self, pdf_paths: List[str]) -> List[Dict]:
+    def process_multiple_pdfs(self, pdf_paths: List[str], workers: int = None) -> List[Dict]:
         """
         Process multiple PDFs at once
         Automatically segregates by patient
+        
+        Extraction runs in a pool of `workers` processes (default: one per CPU);
+        vault assignment stays serial and follows input order, so patient IDs
+        don't depend on which extraction finishes first.
         """
         results = []
+        workers = workers or os.cpu_count() or 1
         
         print(f"\n{'='*70}")
-        print(f"📦 BATCH PROCESSING: {len(pdf_paths)} PDFs")
+        print(f"📦 BATCH PROCESSING: {len(pdf_paths)} PDFs ({workers} worker(s))")
         print(f"{'='*70}\n")
         
-        for i, pdf_path in enumerate(pdf_paths, 1):
-            print(f"\n[{i}/{len(pdf_paths)}] Processing {os.path.basename(pdf_path)}...")
-            try:
-                result = self.process_pdf(pdf_path)
-                results.append(result)
-            except Exception as e:
-                print(f"❌ Failed: {e}")
-                results.append({
-                    'status': 'failed',
-                    'pdf_path': pdf_path,
-                    'error': str(e)
-                })
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            if pool:
+                futures = [pool.submit(_extract_patient_info, pdf_path)
+                           for pdf_path in pdf_paths]
+            for i, pdf_path in enumerate(pdf_paths, 1):
+                print(f"\n[{i}/{len(pdf_paths)}] Processing {os.path.basename(pdf_path)}...")
+                try:
+                    if pool:
+                        patient_info = futures[i - 1].result()
+                    else:
+                        patient_info = self.extract_patient_info(pdf_path)
+                    results.append(self._commit(pdf_path, patient_info))
+                except Exception as e:
+                    print(f"❌ Failed: {e}")
+                    results.append({
+                        'status': 'failed',
+                        'pdf_path': pdf_path,
+                        'error': str(e)
+                    })
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            self.flush_vaults_index()
         
         # Display summary
         self.display_vault_summary()
@@ -556,11 +1052,19 @@ Examples:
     parser.add_argument('--summary', action='store_true', help='Display vault summary')
     parser.add_argument('--vault-dir', type=str, help='Custom vault directory')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Extraction processes for batch runs (default: CPU count)')
+    link_mode = parser.add_mutually_exclusive_group()
+    link_mode.add_argument('--hardlink', dest='hardlink', action='store_true', default=True,
+                           help='Hardlink PDFs into vaults when possible (default)')
+    link_mode.add_argument('--copy', dest='hardlink', action='store_false',
+                           help='Always copy PDFs into vaults')
     
     args = parser.parse_args()
     
     if args.debug:
         Config.DEBUG = True
+    Config.HARDLINK_REPORTS = args.hardlink
     
     # Initialize vault manager
     manager = SmartVaultManager(vault_base_dir=args.vault_dir)
@@ -580,7 +1084,7 @@ Examples:
     else:
         if args.hint:
             print("⚠️  Warning: --hint ignored for batch processing")
-        manager.process_multiple_pdfs(args.pdfs)
+        manager.process_multiple_pdfs(args.pdfs, workers=args.workers)
 
 
 if __name__ == "__main__":